@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+
+# Every dashboard process on the host memory-maps the same files, so the data sits
+# once in the page cache instead of once per process
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "traffic_violations_cache")
+
+TABLE_FILE = "table.arrow"
+META_FILE = "meta.json"  # written last: a version directory is complete once it has one
+
+
+# ------------------ Entries ------------------
+# An entry is one Arrow table (IPC file), named numpy arrays (.npy files) and a JSON dict
+
+def write_entry(directory, table, arrays, meta):
+    # one dictionary per column: the IPC file format cannot replace dictionaries between batches
+    table = table.unify_dictionaries().combine_chunks()
+    with pa.OSFile(os.path.join(directory, TABLE_FILE), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump({"arrays": list(arrays), "meta": meta}, f)
+
+
+def read_entry(directory):
+    # Zero-copy: the table buffers and the arrays point into the mapped files
+    with open(os.path.join(directory, META_FILE)) as f:
+        contents = json.load(f)
+    table = pa.ipc.open_file(pa.memory_map(os.path.join(directory, TABLE_FILE))).read_all()
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in contents["arrays"]}
+    return table, arrays, contents["meta"]
+
+
+def remove_stale(cache_dir, keep):
+    # Processes still mapping an old version keep reading it; the files go when they swap
+    for name in os.listdir(cache_dir):
+        if name not in keep and not name.startswith("."):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def get_or_build(version, build, cache_dir=CACHE_DIR, previous=None):
+    """(table, arrays, meta) of version, memory-mapped from cache_dir.
+
+    The first process to ask for a version calls build() and writes its result to a
+    staging directory, renamed into place in one step, so readers only ever see a
+    complete entry. Once it is in place the versions before previous (the one the
+    caller is replacing, kept for processes that have not swapped yet) are removed.
+    """
+    directory = os.path.join(cache_dir, version)
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=cache_dir)
+        try:
+            write_entry(staging, *build())
+            os.rename(staging, directory)
+            print(f"Arrow cache written: {directory}")
+        except OSError:
+            # another process renamed its copy into place first
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        remove_stale(cache_dir, keep={version, previous})
+    return read_entry(directory)
@@ -0,0 +1,80 @@
+"""Benchmark preprocessing.merge_duplicates against the previous groupby/lambda version.
+
+Usage: python benchmarks/bench_merge_duplicates.py [--rows 100000 1000000 5000000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import preprocessing as pp  # noqa: E402
+
+
+def merge_duplicates_groupby(df, id_col='SeqID', description_col='Description', charge_col='Charge',
+                             desc_sep=' | ', charge_sep=','):
+    # The implementation merge_duplicates replaced, kept as the reference output
+    df.drop_duplicates(inplace=True)
+    df[description_col] = pp.to_upper_strip(df[description_col])
+    df[description_col] = df[description_col].str.lstrip(',| )]\\')
+    df[charge_col] = df[charge_col].astype(str)
+
+    merged = (
+        df.groupby(id_col, sort=False, as_index=False)
+        .agg({
+          description_col: lambda x: desc_sep.join(str(i) for i in pd.unique(x) if pd.notna(i)),
+          charge_col: lambda x: charge_sep.join(str(i) for i in pd.unique(x) if pd.notna(i))
+        })
+    )
+
+    df_unique = df.drop_duplicates(subset=id_col, keep='first')
+    df_unique = df_unique.drop(columns=[description_col, charge_col])
+
+    return df_unique.merge(merged[[id_col, description_col, charge_col]], on=id_col, how='left')
+
+
+def make_frame(n_rows, seed=42):
+    # About 30% of the rows are extra charges for an already seen SeqID, in random order
+    rng = np.random.default_rng(seed)
+    n_ids = max(1, int(n_rows * 0.7))
+    seq_ids = pd.Series(np.arange(n_ids)).map('{:08x}'.format).to_numpy()
+    descriptions = np.array([
+        'DRIVING VEHICLE ON HIGHWAY WITH SUSPENDED REGISTRATION', ', failure to display registration',
+        'EXCEEDING THE POSTED SPEED LIMIT OF 40 MPH', '|) DRIVER FAILURE TO OBEY TRAFFIC CONTROL DEVICE',
+        'PERSON DRIVING MOTOR VEHICLE WHILE SO FAR IMPAIRED BY ALCOHOL', np.nan,
+    ], dtype=object)
+    charges = np.array(['21-801.1', '13-401(h)', '21-201(a1)', '16-303(c)', '21-902(a1)', np.nan], dtype=object)
+    return pd.DataFrame({
+        'SeqID': seq_ids[rng.integers(0, n_ids, n_rows)],
+        'Agency': 'MCP',
+        'Latitude': rng.uniform(38.9, 39.3, n_rows),
+        'Description': descriptions[rng.integers(0, len(descriptions), n_rows)],
+        'Charge': charges[rng.integers(0, len(charges), n_rows)],
+    })
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'groupby (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        expected, old_seconds = timed(merge_duplicates_groupby, df.copy())
+        result, new_seconds = timed(pp.merge_duplicates, df)
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{n_rows:>10} {old_seconds:>12.2f} {new_seconds:>15.2f} {old_seconds / new_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark every preprocessing step and the whole main.py flow on generated data.
+
+Each size runs once, as main.py --no-database --report in a fresh process. The CSV is
+generated by generate_data.py and cached in --data-dir. The run report gives the time,
+peak RSS and rows of every step (micro), and the process the end-to-end time (macro).
+
+Results are stored per commit in --results-dir:
+- <commit>-<rows>.json is the full run report, usable with instrumentation.py compare;
+- history.jsonl gets one line per size and run, to follow performance across commits.
+
+Usage: python benchmarks/bench_pipeline.py [--rows 100000 1000000 10000000] [--stream-above 2000000]
+       python benchmarks/bench_pipeline.py --history
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+import generate_data  # noqa: E402
+
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+# Larger files run in streaming mode, which keeps memory bounded
+STREAM_ABOVE = 2_000_000
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def dataset(rows, data_dir, seed):
+    path = Path(data_dir) / f"traffic_violations_{rows}_{seed}.csv"
+    if not path.exists():
+        generate_data.write_csv(rows, path, seed)
+    return path
+
+
+def run_pipeline(csv_path, report_path, stream, extra_args):
+    cmd = [sys.executable, str(ROOT / "main.py"), str(csv_path), "--no-database", "--report", str(report_path)]
+    cmd += (["--stream"] if stream else []) + extra_args
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stdout[-2000:], result.stderr[-2000:])
+        raise RuntimeError(f"main.py failed on {csv_path}")
+    return seconds
+
+
+def benchmark(rows, args, commit):
+    csv_path = dataset(rows, args.data_dir, args.seed)
+    stream = rows > args.stream_above
+    report_path = Path(args.results_dir) / f"{commit}-{rows}.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+
+    seconds = run_pipeline(csv_path, report_path, stream, args.main_args)
+    with open(report_path) as f:
+        report = json.load(f)
+
+    entry = {
+        "commit": commit,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": rows,
+        "mode": "stream" if stream else "single",
+        "wall_s": round(seconds, 3),
+        "peak_rss_mb": round(report["peak_rss_mb"], 1),
+        "steps": {step["name"]: round(step["wall_s"], 3) for step in report["steps"]},
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+    with open(Path(args.results_dir) / "history.jsonl", "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry, report
+
+
+def print_report(entry, report):
+    print(f"\n{entry['rows']} rows ({entry['mode']}): {entry['wall_s']:.1f}s end to end, "
+          f"peak RSS {entry['peak_rss_mb']:.0f} MB")
+    steps = pd.DataFrame(report["steps"])[["name", "calls", "wall_s", "cpu_s", "rss_peak_mb", "rows_in", "rows_out"]]
+    print(steps.round(3).to_string(index=False))
+
+
+def print_history(results_dir):
+    path = Path(results_dir) / "history.jsonl"
+    if not path.exists():
+        print(f"No history yet: {path}")
+        return
+    history = pd.read_json(path, lines=True)
+    history["commit"] = history["commit"] + history["dirty"].map({True: "+", False: ""})
+    table = history.pivot_table(index="commit", columns="rows", values="wall_s", aggfunc="last", sort=False)
+    print("End-to-end seconds per commit (last run of each size)")
+    print(table.round(2).to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream-above", type=int, default=STREAM_ABOVE,
+                        help="run main.py --stream for files with more rows than this")
+    parser.add_argument("--data-dir", default=str(BENCH_DIR / "data"), help="where generated CSVs are cached")
+    parser.add_argument("--results-dir", default=str(BENCH_DIR / "results"))
+    parser.add_argument("--history", action="store_true", help="print stored results per commit and exit")
+    parser.add_argument("main_args", nargs=argparse.REMAINDER,
+                        help="extra main.py arguments after --, e.g. -- --workers 4")
+    args = parser.parse_args()
+    args.main_args = [a for a in args.main_args if a != "--"]
+
+    if args.history:
+        print_history(args.results_dir)
+        return
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    for rows in args.rows:
+        print_report(*benchmark(rows, args, commit))
+    print()
+    print_history(args.results_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Generate Traffic_Violations.csv-shaped data with the dirt preprocessing has to clean up.
+
+Rows are written in chunks, so any row count fits in memory. The dirt includes:
+- misspelled makes taken from maps.make_map, plus rare one-off makes;
+- the comma spellings of maps.color_map;
+- mixed date formats, some unparseable or too old;
+- '.'-separated times;
+- invalid state codes;
+- 0.0 and missing coordinates;
+- stops with several charges, i.e. duplicated SeqIDs;
+- exact duplicate rows.
+
+Usage: python benchmarks/generate_data.py ROWS OUTPUT.csv [--seed 0] [--chunk-rows 500000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from maps import make_map, color_map, valid_codes, boolean_columns  # noqa: E402
+
+CHUNK_ROWS = 500_000
+
+# Dirt rates, per row
+DIRTY_DATE_FORMAT = 0.10   # %Y-%m-%d instead of %m/%d/%Y
+BAD_DATE = 0.005           # unparseable text
+OLD_DATE = 0.005           # before the 1990 cut-off
+DOTTED_TIME = 0.05         # 14.05.00
+MISSPELLED_MAKE = 0.15
+RARE_MAKE = 0.01
+ODD_COLOR = 0.05
+INVALID_STATE = 0.03
+ZERO_COORDINATES = 0.05
+MISSING = 0.01
+EXACT_DUPLICATE = 0.01
+EXTRA_CHARGE = 0.3         # chance a stop has one more charge, repeated (geometric)
+
+COLUMNS = [
+    'SeqID', 'Date Of Stop', 'Time Of Stop', 'Agency', 'SubAgency', 'Description', 'Location',
+    'Latitude', 'Longitude', *boolean_columns,
+    'Search Disposition', 'Search Outcome', 'Search Reason', 'Search Reason For Stop', 'Search Type',
+    'Search Arrest Reason', 'State', 'VehicleType', 'Year', 'Make', 'Model', 'Color', 'Violation Type',
+    'Charge', 'Article', 'Contributed To Accident', 'Race', 'Gender', 'Driver City', 'Driver State',
+    'DL State', 'Arrest Type', 'Geolocation',
+]
+
+# Canonical makes, most common first (draws are Zipf-distributed over this order)
+POPULAR_MAKES = ['TOYOTA', 'HONDA', 'FORD', 'NISSAN', 'CHEVROLET', 'HYUNDAI', 'DODGE', 'JEEP', 'ACURA', 'LEXUS']
+MAKES = POPULAR_MAKES + sorted(set(make_map.values()) - set(POPULAR_MAKES))
+MISSPELLINGS = sorted(make_map)
+COLORS = ['BLACK', 'WHITE', 'SILVER', 'GRAY', 'RED', 'BLUE', 'GREEN', 'GOLD', 'MAROON', 'TAN']
+CHARGES = [
+    ('EXCEEDING THE POSTED SPEED LIMIT OF 40 MPH', '21-801.1'),
+    ('DRIVING VEHICLE ON HIGHWAY WITH SUSPENDED REGISTRATION', '13-401(h)'),
+    ('FAILURE TO DISPLAY REGISTRATION CARD UPON DEMAND BY POLICE OFFICER', '13-409(b)'),
+    ('DRIVER FAILURE TO OBEY PROPERLY PLACED TRAFFIC CONTROL DEVICE INSTRUCTIONS', '21-201(a1)'),
+    ('DRIVER USING HANDS TO USE HANDHELD TELEPHONE WHILE OPERATING VEHICLE', '21-1124.2(d2)'),
+    ('PERSON DRIVING MOTOR VEHICLE WHILE SO FAR IMPAIRED BY ALCOHOL', '21-902(a1)'),
+    ('FAILURE OF INDIVIDUAL DRIVING ON HIGHWAY TO DISPLAY LICENSE TO UNIFORMED POLICE ON DEMAND', '16-112(c)'),
+    ('HEADLIGHTS INOPERATIVE', '22-226(a)'),
+]
+SUBAGENCIES = ['1st District, Rockville', '2nd District, Bethesda', '3rd District, Silver Spring',
+               '4th District, Wheaton', '5th District, Germantown', '6th District, Gaithersburg / Montgomery Village',
+               'Headquarters and Special Operations']
+CITIES = ['SILVER SPRING', 'GAITHERSBURG', 'GERMANTOWN', 'ROCKVILLE', 'BETHESDA', 'MONTGOMERY VILLAGE',
+          'POTOMAC', 'WASHINGTON', 'CLARKSBURG', 'OLNEY', 'DAMASCUS', 'TAKOMA PARK', 'BALTIMORE']
+VEHICLE_TYPES = ['02 - Automobile', '05 - Light Duty Truck', '03 - Station Wagon', '06 - Heavy Duty Truck',
+                 '01 - Motorcycle', '28 - Other', '08 - Recreational Vehicle']
+# Hotspots violations cluster around, (latitude, longitude, spread)
+HOTSPOTS = [(39.084, -77.153, 0.02), (38.995, -77.030, 0.015), (39.153, -77.207, 0.02),
+            (39.038, -77.053, 0.01), (38.984, -77.094, 0.01), (39.176, -77.271, 0.015)]
+
+
+def zipf_weights(n, a=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    return weights / weights.sum()
+
+
+def pick(rng, values, n, weights=None):
+    values = np.asarray(values, dtype=object)
+    return values[rng.choice(len(values), size=n, p=weights)]
+
+
+def dirty(rng, values, rate, dirt):
+    # Replace a share of values with draws from dirt
+    values = np.asarray(values, dtype=object).copy()
+    mask = rng.random(len(values)) < rate
+    values[mask] = pick(rng, dirt, int(mask.sum()))
+    return values
+
+
+def sprinkle_missing(rng, values, rate=MISSING):
+    values = np.asarray(values, dtype=object).copy()
+    values[rng.random(len(values)) < rate] = np.nan
+    return values
+
+
+# ------------------ Columns ------------------
+def stop_dates(rng, n, start="2012-01-01", end="2024-12-31"):
+    days = pd.date_range(start, end, freq="D")
+    idx = rng.integers(0, len(days), n)
+    us, iso = days.strftime("%m/%d/%Y").to_numpy(dtype=object), days.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    dates = np.where(rng.random(n) < DIRTY_DATE_FORMAT, iso[idx], us[idx])
+    dates = dirty(rng, dates, OLD_DATE, pd.date_range("1970-01-01", "1989-12-31", freq="MS").strftime("%m/%d/%Y"))
+    return sprinkle_missing(rng, dirty(rng, dates, BAD_DATE, ["00/00/0000", "unknown", "13/45/2019"]))
+
+
+def stop_times(rng, n):
+    # every second of the day formatted once, then indexed
+    clock = pd.date_range("2000-01-01", periods=24 * 3600, freq="s").strftime("%H:%M:%S").to_numpy(dtype=object)
+    seconds = rng.integers(0, len(clock), n)
+    dotted = rng.random(n) < DOTTED_TIME
+    times = clock[seconds]
+    times[dotted] = pd.Series(times[dotted], dtype=object).str.replace(":", ".").to_numpy(dtype=object)
+    return sprinkle_missing(rng, times)
+
+
+def coordinates(rng, n):
+    spots = rng.integers(0, len(HOTSPOTS), n)
+    centres = np.array(HOTSPOTS)[spots]
+    lat = rng.normal(centres[:, 0], centres[:, 2]).round(7)
+    lon = rng.normal(centres[:, 1], centres[:, 2]).round(7)
+    zero = rng.random(n) < ZERO_COORDINATES
+    lat[zero], lon[zero] = 0.0, 0.0
+    missing = rng.random(n) < MISSING
+    lat[missing], lon[missing] = np.nan, np.nan
+    return lat, lon
+
+
+def makes(rng, n):
+    values = pick(rng, MAKES, n, zipf_weights(len(MAKES)))
+    values = dirty(rng, values, MISSPELLED_MAKE, MISSPELLINGS)
+    # case and punctuation noise normalize_make strips again
+    noisy = rng.random(n) < 0.05
+    values[noisy] = [f" {v.title()}-" for v in values[noisy]]
+    rare = rng.random(n) < RARE_MAKE
+    values[rare] = ["".join(rng.choice(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"), 5)) for _ in range(int(rare.sum()))]
+    return sprinkle_missing(rng, values)
+
+
+def state_codes(rng, n):
+    weights = np.full(len(valid_codes), 0.2 / (len(valid_codes) - 1))
+    weights[list(valid_codes).index("MD")] = 0.8
+    values = pick(rng, valid_codes, n, weights)
+    return sprinkle_missing(rng, dirty(rng, values, INVALID_STATE, ["XX", "99", "md ", "M D", "US", "--"]))
+
+
+def yes_no(rng, n, p_yes):
+    values = np.where(rng.random(n) < p_yes, "Yes", "No").astype(object)
+    return sprinkle_missing(rng, dirty(rng, values, 0.02, ["yes", " No", "Y", "n", "NO "]))
+
+
+def generate_chunk(rng, n_stops, first_id=0):
+    """One chunk of rows: n_stops stops, each repeated once per charge."""
+    n = n_stops
+    lat, lon = coordinates(rng, n)
+    stops = pd.DataFrame({
+        'SeqID': [f"{i:08x}-{(i * 7919) % 65536:04x}" for i in range(first_id, first_id + n)],
+        'Date Of Stop': stop_dates(rng, n),
+        'Time Of Stop': stop_times(rng, n),
+        'Agency': dirty(rng, np.full(n, "MCP", dtype=object), 0.01, ["mcp", " MCP "]),
+        'SubAgency': dirty(rng, pick(rng, SUBAGENCIES, n), 0.02, ["3rd district, silver spring", "S15"]),
+        'Location': [f"{a} @ {b}" for a, b in zip(rng.zipf(1.3, n) % 5000, pick(rng, ["GEORGIA AVE", "ROCKVILLE PIKE",
+                     "UNIVERSITY BLVD", "NEW HAMPSHIRE AVE", "COLESVILLE RD", "RANDOLPH RD"], n))],
+        'Latitude': lat,
+        'Longitude': lon,
+    })
+    for col in boolean_columns:
+        stops[col] = yes_no(rng, n, 0.4 if col == 'Belts' else 0.03)
+    stops['Search Disposition'] = sprinkle_missing(rng, pick(rng, ["Nothing", "Contraband Only", "Property Only", "nan"], n), 0.9)
+    stops['Search Outcome'] = sprinkle_missing(rng, pick(rng, ["Warning", "Citation", "Arrest", "SERO"], n), 0.9)
+    stops['Search Reason'] = sprinkle_missing(rng, pick(rng, ["Incident to Arrest", "Probable Cause", "Consensual"], n), 0.9)
+    stops['Search Reason For Stop'] = sprinkle_missing(rng, pick(rng, ["21-801.1", "13-401(h)-", "Speeding-"], n), 0.9)
+    stops['Search Type'] = sprinkle_missing(rng, pick(rng, ["Both", "Person", "Property"], n), 0.9)
+    stops['Search Arrest Reason'] = sprinkle_missing(rng, pick(rng, ["Marihuana", "Driving", "DUI", "Warrant"], n), 0.95)
+    stops['State'] = state_codes(rng, n)
+    stops['VehicleType'] = sprinkle_missing(rng, pick(rng, VEHICLE_TYPES, n, zipf_weights(len(VEHICLE_TYPES), 2)))
+    years = rng.normal(2008, 7, n).round()
+    odd = rng.random(n) < 0.01
+    years[odd] = rng.choice([0, 1900, 2099, 9999], int(odd.sum()))
+    stops['Year'] = sprinkle_missing(rng, years)
+    stops['Make'] = makes(rng, n)
+    stops['Model'] = sprinkle_missing(rng, pick(rng, ["CAMRY", "ACCORD", "CIVIC", "4S", "F-150", "COROLLA", "TK",
+                                                       "NONE", "ALTIMA", "00"], n, zipf_weights(10)))
+    stops['Color'] = sprinkle_missing(rng, dirty(rng, pick(rng, COLORS, n, zipf_weights(len(COLORS))),
+                                                 ODD_COLOR, sorted(color_map)))
+    stops['Violation Type'] = pick(rng, ["Citation", "Warning", "ESERO", "SERO"], n, [0.45, 0.5, 0.04, 0.01])
+    stops['Article'] = sprinkle_missing(rng, pick(rng, ["Transportation Article", "Maryland Rules", "00"], n,
+                                                  [0.95, 0.03, 0.02]))
+    stops['Contributed To Accident'] = yes_no(rng, n, 0.03)
+    stops['Race'] = pick(rng, ["WHITE", "BLACK", "HISPANIC", "ASIAN", "OTHER", "NATIVE AMERICAN"], n,
+                         [0.35, 0.3, 0.22, 0.07, 0.05, 0.01])
+    stops['Gender'] = pick(rng, ["M", "F", "U"], n, [0.66, 0.33, 0.01])
+    stops['Driver City'] = sprinkle_missing(rng, dirty(rng, pick(rng, CITIES, n, zipf_weights(len(CITIES))), 0.05,
+                                                       ["xxSILVER SPRING", "silver spring ", "GAITHERSBRG", "ROCKVILE"]))
+    stops['Driver State'] = state_codes(rng, n)
+    stops['DL State'] = state_codes(rng, n)
+    stops['Arrest Type'] = pick(rng, ["A - Marked Patrol", "Q - Marked Laser", "B - Unmarked Patrol",
+                                      "S - License Plate Recognition"], n, [0.8, 0.1, 0.07, 0.03])
+    stops['Geolocation'] = "(" + stops['Latitude'].astype(str) + ", " + stops['Longitude'].astype(str) + ")"
+
+    # Stops with several charges repeat every column except Description/Charge
+    charges = rng.geometric(1 - EXTRA_CHARGE, n)
+    rows = stops.loc[stops.index.repeat(charges)].reset_index(drop=True)
+    charge = rng.choice(len(CHARGES), len(rows))
+    rows['Description'] = sprinkle_missing(rng, [CHARGES[c][0] for c in charge])
+    rows['Charge'] = [CHARGES[c][1] for c in charge]
+    rows['Description'] = dirty(rng, rows['Description'], 0.01, [", failure to display registration", "|) HEADLIGHTS INOPERATIVE"])
+
+    duplicates = rows.sample(frac=EXACT_DUPLICATE, random_state=int(rng.integers(1 << 31)))
+    return pd.concat([rows, duplicates], ignore_index=True)[COLUMNS]
+
+
+def generate(rows, seed=0, chunk_rows=CHUNK_ROWS):
+    """Yield chunks until rows rows are produced (the last chunk is trimmed)."""
+    rng = np.random.default_rng(seed)
+    # every stop produces 1 / (1 - EXTRA_CHARGE) rows on average, plus the exact duplicates
+    rows_per_stop = (1 / (1 - EXTRA_CHARGE)) * (1 + EXACT_DUPLICATE)
+    produced, first_id = 0, 0
+    while produced < rows:
+        n_stops = max(1, int(min(chunk_rows, rows - produced) / rows_per_stop))
+        chunk = generate_chunk(rng, n_stops, first_id).head(rows - produced)
+        first_id += n_stops
+        produced += len(chunk)
+        yield chunk
+
+
+def write_csv(rows, path, seed=0, chunk_rows=CHUNK_ROWS):
+    start = time.perf_counter()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    for i, chunk in enumerate(generate(rows, seed, chunk_rows)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    print(f"Generated {rows} rows into {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    write_csv(args.rows, args.output, args.seed, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
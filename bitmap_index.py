@@ -0,0 +1,156 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Columns with at most this many distinct values keep one packed bitmap per value
+# (rows / 8 bytes each); columns with more (location) keep sorted posting lists
+DENSE_VALUES = 64
+
+# Bitmaps are packed least significant bit first, the layout of an Arrow boolean
+# array, so a combined bitmap becomes a filter mask without unpacking it
+BIT_ORDER = "little"
+
+NULL_DATE = np.iinfo(np.int64).max  # missing dates sort last
+
+
+def codes_and_values(column):
+    """Dictionary codes of a table column (-1 for null) and its distinct values."""
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column)
+    # Parquet files and row groups each carry their own dictionary
+    column = column.unify_dictionaries().combine_chunks()
+    codes = pc.fill_null(column.indices.cast(pa.int64()), -1).to_numpy()
+    return codes, column.dictionary.to_pylist()
+
+
+def positions_bitmap(positions, first_byte, last_byte):
+    """Packed bitmap of rows first_byte * 8 to last_byte * 8 with the given row positions set."""
+    bits = np.zeros((last_byte - first_byte) * 8, dtype=bool)
+    positions = positions[(positions >= first_byte * 8) & (positions < last_byte * 8)]
+    bits[positions - first_byte * 8] = True
+    return np.packbits(bits, bitorder=BIT_ORDER)
+
+
+def boolean_mask(bitmap, offset, length):
+    # Zero-copy Arrow view of length bits of bitmap, starting offset bits in
+    return pa.BooleanArray.from_buffers(pa.bool_(), length, [None, pa.py_buffer(bitmap)], offset=offset)
+
+
+# ------------------ Per-column postings ------------------
+class ColumnPostings:
+    """The rows holding each distinct value of one column.
+
+    Few values: a packed bitmap per value, so a selection is an OR of byte arrays.
+    Many values: one array of row positions grouped by value (ascending within a value)
+    and the offset of every value's group, so a selection only touches its own rows.
+    """
+
+    def __init__(self, values, bitmaps=None, positions=None, offsets=None):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self.bitmaps = bitmaps  # (values, bytes) uint8
+        self.positions = positions
+        self.offsets = offsets
+
+    @property
+    def dense(self):
+        return self.bitmaps is not None
+
+    @classmethod
+    def build(cls, column):
+        codes, values = codes_and_values(column)
+        if len(values) <= DENSE_VALUES:
+            bitmaps = np.zeros((len(values), (len(codes) + 7) // 8), dtype=np.uint8)
+            for code in range(len(values)):
+                bitmaps[code] = np.packbits(codes == code, bitorder=BIT_ORDER)
+            return cls(values, bitmaps=bitmaps)
+        position_type = np.int32 if len(codes) < 2 ** 31 else np.int64
+        positions = np.argsort(codes, kind="stable").astype(position_type)
+        return cls(values, positions=positions, offsets=np.searchsorted(codes[positions], np.arange(len(values) + 1)))
+
+    def arrays(self):
+        if self.dense:
+            return {"bitmaps": self.bitmaps}
+        return {"positions": self.positions, "offsets": self.offsets}
+
+    def value_positions(self, code, first_row, last_row):
+        rows = self.positions[self.offsets[code]:self.offsets[code + 1]]
+        return rows[np.searchsorted(rows, first_row):np.searchsorted(rows, last_row)]
+
+    def bitmap(self, values, first_byte, last_byte):
+        """Packed bitmap of the rows in bytes first_byte..last_byte holding any of values."""
+        codes = [self.codes[value] for value in values if value in self.codes]
+        if self.dense:
+            bitmap = np.zeros(last_byte - first_byte, dtype=np.uint8)
+            for code in codes:
+                np.bitwise_or(bitmap, self.bitmaps[code][first_byte:last_byte], out=bitmap)
+            return bitmap
+        bits = np.zeros((last_byte - first_byte) * 8, dtype=bool)
+        for code in codes:
+            bits[self.value_positions(code, first_byte * 8, last_byte * 8) - first_byte * 8] = True
+        return np.packbits(bits, bitorder=BIT_ORDER)
+
+
+# ------------------ Filter index ------------------
+class FilterIndex:
+    """Multiselect and date filters over an in-memory table sorted by date.
+
+    The date range is a binary search pair over the sorted dates; every other filter
+    becomes a packed bitmap restricted to those rows and the bitmaps are ANDed.
+    select() returns the matching rows as a row range and a mask over it, so the
+    caller slices and filters the table once without copying the columns first.
+    """
+
+    def __init__(self, dates, postings):
+        self.dates = dates  # int64 nanoseconds, sorted, NULL_DATE for missing
+        self.postings = postings
+
+    @classmethod
+    def build(cls, table, date_column, columns):
+        dates = pc.fill_null(table[date_column].cast(pa.timestamp("ns")).cast(pa.int64()), NULL_DATE)
+        return cls(dates.to_numpy(), {col: ColumnPostings.build(table[col]) for col in columns})
+
+    def arrays(self):
+        """The index as named numpy arrays and the values of every column, e.g. to store it on disk."""
+        arrays = {"dates": self.dates}
+        for col, postings in self.postings.items():
+            arrays.update({f"{col}.{name}": array for name, array in postings.arrays().items()})
+        return arrays, {col: postings.values for col, postings in self.postings.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, values):
+        postings = {}
+        for col, col_values in values.items():
+            col_arrays = {name[len(col) + 1:]: array for name, array in arrays.items() if name.startswith(f"{col}.")}
+            postings[col] = ColumnPostings(col_values, **col_arrays)
+        return cls(arrays["dates"], postings)
+
+    @property
+    def num_rows(self):
+        return len(self.dates)
+
+    def date_rows(self, start, end):
+        # start/end are nanosecond timestamps, both inclusive
+        return int(np.searchsorted(self.dates, start, side="left")), int(np.searchsorted(self.dates, end, side="right"))
+
+    def select(self, date_range=None, selections=None, candidates=()):
+        """Rows matching every filter: (slice of rows, pa.BooleanArray over the slice or None).
+
+        date_range: (start, end) nanoseconds or None for all rows (missing dates included);
+        selections: {column: values}, an empty selection means no filter;
+        candidates: arrays of row positions (e.g. from a spatial index) the rows must also be in.
+        """
+        first_row, last_row = self.date_rows(*date_range) if date_range is not None else (0, self.num_rows)
+        first_byte, last_byte = first_row // 8, (last_row + 7) // 8
+        bitmaps = [self.postings[col].bitmap(values, first_byte, last_byte)
+                   for col, values in (selections or {}).items() if values]
+        bitmaps += [positions_bitmap(positions, first_byte, last_byte) for positions in candidates]
+        rows = slice(first_row, max(first_row, last_row))
+        if not bitmaps or last_row <= first_row:
+            return rows, None
+
+        bitmap = bitmaps[0]
+        for other in bitmaps[1:]:
+            np.bitwise_and(bitmap, other, out=bitmap)
+        # the first byte can start before the date range
+        return rows, boolean_mask(bitmap, first_row - first_byte * 8, last_row - first_row)
@@ -0,0 +1,183 @@
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import types
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+# A checkpoint is the pickled output of one stage of a single-shot run, named
+# <stage>-<key>.pkl. The key chains the input file, the run settings and the code and
+# bound arguments of every stage up to this one, so a checkpoint is reused only while
+# none of them changed; editing one cleaning rule only invalidates that step and the
+# ones after it.
+DEFAULT_CHECKPOINT_DIR = "checkpoints"
+
+
+def stage_file_prefix(name):
+    return re.sub(r"\W+", "_", name).strip("_").lower() + "-"
+
+
+# ------------------ Fingerprints ------------------
+def canonical(value):
+    # Same contents -> same repr: sets and dicts in sorted order, objects by their
+    # attributes, functions by their code, arrays as lists (their repr is abbreviated)
+    if isinstance(value, (types.FunctionType, partial)):
+        return ("code", code_fingerprint(value))
+    if isinstance(value, dict):
+        return ("dict", sorted(((canonical(k), canonical(v)) for k, v in value.items()), key=repr))
+    if isinstance(value, (set, frozenset)):
+        return ("set", sorted((canonical(v) for v in value), key=repr))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(v) for v in value)
+    if isinstance(value, (pd.Index, pd.Series, np.ndarray)):
+        return (type(value).__name__, str(getattr(value, "dtype", "")), [canonical(v) for v in value.tolist()])
+    if hasattr(value, "__dict__") and not isinstance(value, (type, types.ModuleType)):
+        return (type(value).__qualname__, canonical(vars(value)))
+    return value
+
+
+def value_fingerprint(value):
+    # repr, not pickle: pickle output also depends on which equal values are the same object
+    return hashlib.sha1(repr(canonical(value)).encode()).hexdigest()
+
+
+def referenced_globals(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= referenced_globals(const)
+    return names
+
+
+def code_fingerprint(func, seen=None):
+    """Hash of a function's source, of the functions and constants of its own module it
+    uses (recursively) and, for a partial, of the arguments bound to it."""
+    if isinstance(func, partial):
+        return value_fingerprint((code_fingerprint(func.func, seen), func.args, func.keywords))
+
+    seen = set() if seen is None else seen
+    seen.add(func)
+    try:
+        parts = [inspect.getsource(func)]
+    except (OSError, TypeError):
+        return value_fingerprint(getattr(func, "__qualname__", repr(func)))
+
+    # underscore names are module state (caches), not rules
+    for name in sorted(n for n in referenced_globals(func.__code__) if not n.startswith("_")):
+        value = func.__globals__.get(name)
+        if isinstance(value, types.FunctionType):
+            if value.__module__ == func.__module__ and value not in seen:
+                parts.append(code_fingerprint(value, seen))
+        elif isinstance(value, (str, int, float, list, tuple, dict, set, frozenset)):
+            parts.append(f"{name}={value_fingerprint(value)}")
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def source_key(file_path, **settings):
+    """Key of a run's input: the file's path, size and modification time plus its settings."""
+    stat = os.stat(file_path)
+    return value_fingerprint((os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, settings))
+
+
+# ------------------ Checkpoint store ------------------
+class CheckpointStore:
+    """One checkpoint per stage in a directory; saving a stage evicts its stale checkpoints."""
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name, key):
+        return os.path.join(self.directory, f"{stage_file_prefix(name)}{key[:16]}.pkl")
+
+    def exists(self, name, key):
+        return os.path.exists(self.path(name, key))
+
+    def load(self, name, key):
+        with open(self.path(name, key), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, name, key, value):
+        path = self.path(name, key)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)  # an interrupted save never leaves a partial checkpoint
+        self.evict(name, keep=path)
+        print(f"Checkpoint saved: {path}")
+
+    def evict(self, name, keep=None):
+        prefix = stage_file_prefix(name)
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            if file_name.startswith(prefix) and path != keep:
+                os.remove(path)
+
+
+# ------------------ Stage runner ------------------
+class Deferred:
+    """A stage output that is only computed (or read from its checkpoint) when asked for."""
+
+    def __init__(self, compute):
+        self.compute = compute
+        self.ready = False
+        self.value = None
+
+    def get(self):
+        if not self.ready:
+            self.value, self.ready, self.compute = self.compute(), True, None
+        return self.value
+
+    def take(self):
+        # Hands the value on without keeping a reference, for frames the next stage replaces
+        value, self.value = self.get(), None
+        return value
+
+
+class StageRunner:
+    """Runs the stages of a single-shot run in order, reusing checkpoints.
+
+    run() chains the stage into the run's key and returns a Deferred output: a stage
+    whose checkpoint is valid is not run, and its checkpoint is only read when a later
+    stage that has to run needs it. side() does the same for a stage whose output the
+    later stages do not take as input (their bound arguments already cover it), so it
+    does not enter the chain. Stages from from_step on ignore their checkpoints;
+    stopped is set once until_step has run. Without a store nothing is saved or reused.
+    """
+
+    def __init__(self, store, key, from_step=None, until_step=None):
+        self.store = store
+        self.key = key
+        self.from_step = from_step
+        self.until_step = until_step
+        self.reuse = store is not None
+        self.stopped = False
+
+    def matches(self, pattern, names):
+        return pattern is not None and any(pattern.lower() in name.lower() for name in names)
+
+    def run(self, name, compute, fingerprint, names=()):
+        """names: further names --from-step/--until-step may match, e.g. steps run as one stage."""
+        self.key = value_fingerprint((self.key, name, fingerprint))
+        return self.side(name, compute, fingerprint, names, key=self.key)
+
+    def side(self, name, compute, fingerprint, names=(), key=None):
+        key = key or value_fingerprint((self.key, name, fingerprint))
+        if self.matches(self.from_step, [name, *names]):
+            self.reuse = False
+        if self.matches(self.until_step, [name, *names]):
+            self.stopped = True
+
+        if self.reuse and self.store.exists(name, key):
+            print(f"Reusing checkpoint: {name}")
+            return Deferred(lambda: self.store.load(name, key))
+
+        def compute_and_save():
+            value = compute()
+            if self.store is not None:
+                self.store.save(name, key, value)
+            return value
+        return Deferred(compute_and_save)
@@ -0,0 +1,89 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+# Rows serialized to CSV at a time, and characters handed to COPY per read() call
+BATCH_ROWS = 50_000
+READ_SIZE = 1024 * 1024
+
+
+class CsvStream(io.TextIOBase):
+    """Read-only file object that serializes a DataFrame to headerless CSV lazily.
+
+    Only one batch of BATCH_ROWS rows is held as text at a time, so COPY can read
+    the whole frame without building a second full-size copy in a StringIO.
+    """
+
+    def __init__(self, df, batch_rows=BATCH_ROWS):
+        self._df = df
+        self._batch_rows = batch_rows
+        self._next_row = 0
+        self._batch = ""
+        self._pos = 0
+        self.bytes_sent = 0
+
+    def readable(self):
+        return True
+
+    def _next_batch(self):
+        if self._next_row >= len(self._df):
+            return False
+        rows = self._df.iloc[self._next_row:self._next_row + self._batch_rows]
+        self._next_row += self._batch_rows
+        self._batch = rows.to_csv(index=False, header=False)
+        self._pos = 0
+        self.bytes_sent += len(self._batch.encode("utf-8"))
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            parts = [self._batch[self._pos:]]
+            while self._next_batch():
+                parts.append(self._batch)
+            self._batch, self._pos = "", 0
+            return "".join(parts)
+
+        while self._pos >= len(self._batch):
+            if not self._next_batch():
+                return ""
+        out = self._batch[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
+
+
+def copy_frame(cursor, df, table, batch_rows=BATCH_ROWS):
+    # COPY df into table through a CsvStream; returns the number of bytes sent
+    stream = CsvStream(df, batch_rows)
+    cols = ",".join(df.columns)
+
+    copy_sql = f"""
+    COPY {table} ({cols})
+    FROM STDIN
+    WITH (FORMAT CSV)
+    """
+
+    cursor.copy_expert(copy_sql, stream, size=READ_SIZE)
+    return stream.bytes_sent
+
+
+def parallel_copy(engine, df, table, connections):
+    """COPY contiguous row ranges of df into table over several pooled connections.
+
+    Each range commits on its own, so table should be a staging table that is
+    merged in one transaction afterwards.
+    """
+    edges = [len(df) * i // connections for i in range(connections + 1)]
+    parts = [df.iloc[start:stop] for start, stop in zip(edges[:-1], edges[1:]) if stop > start]
+
+    def load(part):
+        with engine.begin() as conn:
+            return copy_frame(conn.connection.cursor(), part, table)
+
+    with ThreadPoolExecutor(max_workers=len(parts) or 1) as pool:
+        return sum(pool.map(load, parts))
+
+
+def report_throughput(rows, nbytes, seconds):
+    seconds = max(seconds, 1e-9)
+    mb = nbytes / 1024 ** 2
+    print(f"Loaded {rows} rows ({mb:.1f} MB) in {seconds:.1f}s: "
+          f"{rows / seconds:,.0f} rows/s, {mb / seconds:.1f} MB/s")
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# "c" is pandas' parser; "pyarrow" parses blocks of the file on every core (single-shot
+# reads only, it has no chunked reader). Both give the same frame for the same dtypes
+# once the categories are sorted: each engine lists them in its own order.
+ENGINES = ["c", "pyarrow"]
+
+# Compressed inputs are decompressed while they are parsed, never to a temporary file
+COMPRESSION = {".gz": "gzip", ".zst": "zstd"}
+# Rough size of the CSV text per compressed byte, to size streaming partitions
+COMPRESSION_RATIO = 6
+
+
+def compression(file_path):
+    return COMPRESSION.get(os.path.splitext(file_path)[1].lower())
+
+
+def estimated_size(file_path):
+    size = os.path.getsize(file_path)
+    return size * COMPRESSION_RATIO if compression(file_path) else size
+
+
+def open_input(file_path):
+    # pyarrow decompresses gzip and zstd itself; without it pandas infers the compression
+    # from the extension (.zst then needs the zstandard package)
+    codec = compression(file_path)
+    if codec and pa is not None:
+        return pa.input_stream(file_path, compression=codec)
+    return file_path
+
+
+def header(file_path):
+    source = open_input(file_path)
+    try:
+        return list(pd.read_csv(source, nrows=0).columns)
+    finally:
+        if not isinstance(source, str):
+            source.close()
+
+
+def report_read(file_path, rows, seconds):
+    seconds = max(seconds, 1e-9)
+    mb = os.path.getsize(file_path) / 1024 ** 2
+    codec = compression(file_path)
+    print(f"Read {rows} rows ({mb:.1f} MB{f' {codec}' if codec else ''}) in {seconds:.1f}s: "
+          f"{mb / seconds:.1f} MB/s, {rows / seconds:,.0f} rows/s")
+
+
+def read_csv(file_path, dtype=None, usecols=None, engine="c"):
+    """The whole file as one frame; usecols is a predicate on the column names."""
+    start = time.perf_counter()
+    if engine == "pyarrow" and usecols is not None:
+        usecols = [col for col in header(file_path) if usecols(col)]  # the pyarrow parser takes a list
+    source = open_input(file_path)
+    try:
+        df = pd.read_csv(source, dtype=dtype, usecols=usecols, engine=engine)
+    finally:
+        if not isinstance(source, str):
+            source.close()
+    report_read(file_path, len(df), time.perf_counter() - start)
+    return sort_categories(df)
+
+
+def sort_categories(df):
+    # The C parser unions the categories of its internal chunks and pyarrow keeps them in
+    # order of appearance; sorted, both engines give the same categories in the same order
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and not df[col].cat.categories.is_monotonic_increasing:
+            df[col] = df[col].cat.reorder_categories(df[col].cat.categories.sort_values())
+    return df
+
+
+def stream_csv(file_path, chunksize, dtype=None, usecols=None):
+    """Chunks of chunksize rows from pandas' parser, throughput reported after the last one."""
+    start, rows = time.perf_counter(), 0
+    source = open_input(file_path)
+    try:
+        with pd.read_csv(source, chunksize=chunksize, dtype=dtype, usecols=usecols) as reader:
+            for chunk in reader:
+                rows += len(chunk)
+                yield chunk
+    finally:
+        if not isinstance(source, str):
+            source.close()
+    report_read(file_path, rows, time.perf_counter() - start)
@@ -0,0 +1,378 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+
+import pandas as pd
+from sqlalchemy import text
+
+import spatial
+from load_batches import published_batch
+from rollups import flag_is_set
+
+ROLLUP = "violations_daily_rollup"
+FILTER_COLUMNS = ["location", "violation_type", "gender", "race", "vehicle_category"]
+
+# Bounding box side used when only the other coordinate is filtered
+WORLD_LATITUDE = (-90.0, 90.0)
+WORLD_LONGITUDE = (-180.0, 180.0)
+
+# Threads for the startup queries; each holds one pooled connection (the default pool is 5 + 10 overflow)
+STARTUP_WORKERS = 8
+
+# Filtered results kept per server process
+CACHE_SIZE = 256
+CACHE_TTL = 600  # seconds
+
+# How often the dashboard looks for newly published load batches
+REFRESH_SECONDS = 60
+
+
+# ------------------ Result cache ------------------
+class ResultCache:
+    """LRU cache with a time-to-live, shared by every session of the dashboard."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[0] < self.ttl:
+                self._items.move_to_end(key)
+                return item[1]
+
+        value = compute()
+        with self._lock:
+            self._items[key] = (now, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# ------------------ Filter state ------------------
+@dataclass(frozen=True)
+class Filters:
+    start_date: object = None
+    end_date: object = None
+    location: tuple = ()
+    violation_type: tuple = ()
+    gender: tuple = ()
+    race: tuple = ()
+    vehicle_category: tuple = ()
+    latitude_range: tuple = None  # None = no coordinate filter
+    longitude_range: tuple = None
+
+    @property
+    def uses_coordinates(self):
+        return self.latitude_range is not None or self.longitude_range is not None
+
+
+def normalize_filters(start_date, end_date, selections, latitude_range, longitude_range,
+                      latitude_bounds, longitude_bounds):
+    # Sorted tuples make the same selection in a different click order hit the same
+    # cache entry; slider ranges at their full bounds mean "no filter" so rollups can be used
+    def bounded(value, bounds):
+        return None if tuple(value) == tuple(bounds) else tuple(value)
+
+    return Filters(
+        start_date=start_date if start_date and end_date else None,
+        end_date=end_date if start_date and end_date else None,
+        **{col: tuple(sorted(selections.get(col) or ())) for col in FILTER_COLUMNS},
+        latitude_range=bounded(latitude_range, latitude_bounds),
+        longitude_range=bounded(longitude_range, longitude_bounds),
+    )
+
+
+def where_clause(filters, coordinates=True):
+    """Parameterized WHERE clause for filters, on columns that both the raw table and the rollup have."""
+    clauses, params = ["TRUE"], {}
+    if filters.start_date is not None:
+        clauses.append("date_of_stop BETWEEN :start_date AND :end_date")
+        params.update(start_date=filters.start_date, end_date=filters.end_date)
+    for col in FILTER_COLUMNS:
+        values = getattr(filters, col)
+        if values:
+            clauses.append(f"{col} = ANY(:{col})")
+            params[col] = list(values)
+    if coordinates and filters.uses_coordinates:
+        # One bounding box test on the geolocation point (GiST indexed) instead of two range scans;
+        # rows without coordinates have a NULL point and drop out, as they did with BETWEEN
+        (lat_min, lat_max), (lon_min, lon_max) = (filters.latitude_range or WORLD_LATITUDE,
+                                                  filters.longitude_range or WORLD_LONGITUDE)
+        clauses.append("geolocation <@ box(point(:lon_min, :lat_min), point(:lon_max, :lat_max))")
+        params.update(lat_min=float(lat_min), lat_max=float(lat_max), lon_min=float(lon_min), lon_max=float(lon_max))
+    return " AND ".join(clauses), params
+
+
+def counts_source(filters):
+    # (table, count expression): the rollup unless a coordinate filter needs the raw rows
+    if filters.uses_coordinates:
+        return "traffic_violations", "COUNT(*)"
+    return ROLLUP, "SUM(violation_count)"
+
+
+# ------------------ Startup queries ------------------
+# The summary metrics and the sidebar come from small independent queries. Each returns
+# a fragment of the summary or options dict; run_concurrently runs them on a thread pool,
+# so the first paint waits for the slowest query instead of for all of them in turn.
+
+def run_concurrently(tasks, workers=STARTUP_WORKERS):
+    """Run {name: callable} on a thread pool; returns ({name: result}, {name: seconds})."""
+    def timed(func):
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+        futures = {name: pool.submit(timed, func) for name, func in tasks.items()}
+        done = {name: future.result() for name, future in futures.items()}
+    return {name: result for name, (result, _) in done.items()}, {name: s for name, (_, s) in done.items()}
+
+
+def merge_fragments(results):
+    merged = {}
+    for fragment in results.values():
+        merged.update(fragment)
+    return merged
+
+
+def fetch_totals(engine):
+    totals = pd.read_sql(f"""
+        SELECT COALESCE(SUM(violation_count), 0) AS total,
+               COALESCE(SUM(accident_count), 0) AS accidents
+        FROM {ROLLUP}
+        """, engine).iloc[0]
+    return {"total": int(totals["total"]), "accidents": int(totals["accidents"])}
+
+
+def fetch_top_value(engine, column, rollup=ROLLUP):
+    top_df = pd.read_sql(f"""
+        SELECT {column} FROM {rollup}
+        WHERE {column} IS NOT NULL
+        GROUP BY {column}
+        ORDER BY SUM(violation_count) DESC
+        LIMIT 1
+        """, engine)
+    return {column: top_df[column].iloc[0] if not top_df.empty else "N/A"}
+
+
+def fetch_options(engine, column):
+    query = f"SELECT DISTINCT {column} FROM {ROLLUP} WHERE {column} IS NOT NULL ORDER BY {column}"
+    return {column: pd.read_sql(query, engine)[column].tolist()}
+
+
+def fetch_min_date(engine):
+    return {"min_date": pd.read_sql(f"SELECT MIN(date_of_stop) AS min_date FROM {ROLLUP}", engine)["min_date"].iloc[0]}
+
+
+def summary_tasks(engine):
+    return {
+        "totals": partial(fetch_totals, engine),
+        "top location": partial(fetch_top_value, engine, "location"),
+        "top make": partial(fetch_top_value, engine, "make"),
+        "top model": partial(fetch_top_value, engine, "model", "violations_model_rollup"),
+    }
+
+
+def option_tasks(engine):
+    return {
+        **{f"{col} options": partial(fetch_options, engine, col) for col in FILTER_COLUMNS},
+        "min date": partial(fetch_min_date, engine),
+        "coordinate bounds": lambda: {"bounds": fetch_coordinate_bounds(engine)},
+    }
+
+
+def fetch_summary(engine):
+    return merge_fragments(run_concurrently(summary_tasks(engine))[0])
+
+
+def fetch_filter_options(engine):
+    return merge_fragments(run_concurrently(option_tasks(engine))[0])
+
+
+# ------------------ Delta refresh ------------------
+# A load becomes visible once refresh_rollups publishes its batch. The summary is then
+# read again from the (small) rollups, while the option lists, minimum date and coordinate
+# bounds are extended with the rows of the new batches only, found through the
+# load_batch index, instead of being fetched again from the whole table.
+
+# Batches published after publication :since, up to :until
+PUBLISHED_BETWEEN = "SELECT batch_id FROM load_batches WHERE publication > :since AND publication <= :until"
+
+
+def fetch_published_batch(engine):
+    with engine.connect() as conn:
+        return published_batch(conn)
+
+
+def fetch_new_options(engine, column, since, until):
+    query = f"""
+        SELECT DISTINCT {column} FROM traffic_violations
+        WHERE load_batch IN ({PUBLISHED_BETWEEN}) AND {column} IS NOT NULL
+        """
+    return {column: pd.read_sql(text(query), engine, params={"since": since, "until": until})[column].tolist()}
+
+
+def fetch_new_extent(engine, since, until):
+    extent = pd.read_sql(text(f"""
+        SELECT MIN(date_of_stop) AS min_date,
+               MIN(latitude) AS lat_min, MAX(latitude) AS lat_max,
+               MIN(longitude) AS lon_min, MAX(longitude) AS lon_max
+        FROM traffic_violations
+        WHERE load_batch IN ({PUBLISHED_BETWEEN})
+        """), engine, params={"since": since, "until": until}).iloc[0]
+    return {"min_date": extent["min_date"],
+            "bounds": extent[["lat_min", "lat_max", "lon_min", "lon_max"]].astype(float)}
+
+
+def delta_tasks(engine, since, until):
+    return {
+        **{f"new {col} options": partial(fetch_new_options, engine, col, since, until) for col in FILTER_COLUMNS},
+        "new dates and bounds": partial(fetch_new_extent, engine, since, until),
+    }
+
+
+def merge_delta(options, delta):
+    # Loads only add values and widen ranges; values no row uses any more stay listed
+    merged = dict(options)
+    for col in FILTER_COLUMNS:
+        merged[col] = sorted(set(options[col]) | set(delta[col]))
+    if pd.notna(delta["min_date"]):
+        merged["min_date"] = delta["min_date"] if pd.isna(options["min_date"]) else min(options["min_date"], delta["min_date"])
+    bounds, new = options["bounds"].copy(), delta["bounds"]
+    for side, pick in (("lat_min", min), ("lon_min", min), ("lat_max", max), ("lon_max", max)):
+        if pd.notna(new[side]):
+            bounds[side] = new[side] if pd.isna(bounds[side]) else pick(bounds[side], new[side])
+    merged["bounds"] = bounds
+    return merged
+
+
+class StartupData:
+    """Summary metrics and filter options of a backend, shared by every session.
+
+    Loaded with the startup queries, then kept current: every refresh_seconds the latest
+    batch publication (the Parquet backend: the dataset version) is checked and, when it
+    moved, the backend's delta_tasks fetch only what the newly published batches add. Backends
+    without delta_tasks run the startup queries again.
+    """
+
+    def __init__(self, backend, source, refresh_seconds=REFRESH_SECONDS):
+        self.backend = backend
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self.batch = self.backend.fetch_published_batch(source)
+        self.summary, self.options = self.run(self.backend.summary_tasks(source), self.backend.option_tasks(source))
+        self._checked = time.monotonic()
+
+    def run(self, summary_tasks, other_tasks):
+        # seconds per query and wall time of the last (startup or delta) round, for the load timings
+        start = time.perf_counter()
+        results, self.seconds = run_concurrently({**summary_tasks, **other_tasks})
+        self.wall = time.perf_counter() - start
+        return (merge_fragments({name: results[name] for name in summary_tasks}),
+                merge_fragments({name: results[name] for name in other_tasks}))
+
+    def current(self):
+        """(summary, options, batch), refreshed first when a newer batch was published."""
+        with self._lock:
+            if time.monotonic() - self._checked >= self.refresh_seconds:
+                self._checked = time.monotonic()
+                batch = self.backend.fetch_published_batch(self.source)
+                if batch != self.batch:
+                    self.refresh(batch)
+            return self.summary, self.options, self.batch
+
+    def refresh(self, batch):
+        summary_tasks = self.backend.summary_tasks(self.source)
+        if hasattr(self.backend, "delta_tasks"):
+            self.summary, delta = self.run(summary_tasks, self.backend.delta_tasks(self.source, self.batch, batch))
+            self.options = merge_delta(self.options, delta)
+        else:
+            self.summary, self.options = self.run(summary_tasks, self.backend.option_tasks(self.source))
+        print(f"Dashboard data refreshed to load batch {batch} in {self.wall:.2f}s")
+        self.batch = batch
+
+
+# ------------------ Queries ------------------
+
+def fetch_trend(engine, filters):
+    table, count = counts_source(filters)
+    where, params = where_clause(filters, coordinates=filters.uses_coordinates)
+    query = f"""
+        SELECT date_trunc('month', date_of_stop)::date AS date_of_stop, {count} AS count
+        FROM {table}
+        WHERE {where} AND date_of_stop IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+        """
+    return pd.read_sql(text(query), engine, params=params)
+
+
+def fetch_top(engine, column, filters, limit=10):
+    table, count = counts_source(filters)
+    where, params = where_clause(filters, coordinates=filters.uses_coordinates)
+    query = f"""
+        SELECT {column}, {count} AS count
+        FROM {table}
+        WHERE {where} AND {column} IS NOT NULL
+        GROUP BY {column}
+        ORDER BY count DESC
+        LIMIT {int(limit)}
+        """
+    return pd.read_sql(text(query), engine, params=params).set_index(column)["count"]
+
+
+def fetch_vehicle_types(engine, filters):
+    where, params = where_clause(filters)
+    query = f"""
+        SELECT vehicletype, {flag_is_set("accident")} AS accident, COUNT(*) AS count
+        FROM traffic_violations
+        WHERE {where} AND vehicletype IS NOT NULL
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+        GROUP BY 1, 2
+        ORDER BY count DESC
+        """
+    return pd.read_sql(text(query), engine, params=params)
+
+
+def fetch_heatmap_cells(engine, filters, zoom=spatial.MAX_ZOOM):
+    # Every filtered row binned into grid cells in SQL; only occupied cells come back
+    where, params = where_clause(filters)
+    query = f"""
+        SELECT floor(longitude / :cell_size)::bigint AS x,
+               floor(latitude / :cell_size)::bigint AS y,
+               COUNT(*) AS count,
+               COUNT(*) FILTER (WHERE {flag_is_set("accident")}) AS accidents
+        FROM traffic_violations
+        WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL
+          AND latitude <> 0 AND longitude <> 0
+        GROUP BY 1, 2
+        """
+    params["cell_size"] = spatial.cell_size(zoom)
+    return pd.read_sql(text(query), engine, params=params)
+
+
+def fetch_heatmap(engine, filters):
+    return spatial.TilePyramid.from_cells(fetch_heatmap_cells(engine, filters))
+
+
+def fetch_coordinate_bounds(engine):
+    query = """
+        SELECT MIN(lat_min) AS lat_min, MAX(lat_max) AS lat_max,
+               MIN(lon_min) AS lon_min, MAX(lon_max) AS lon_max
+        FROM violations_extent_rollup
+        """
+    return pd.read_sql(query, engine).iloc[0].astype(float)
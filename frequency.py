@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import preprocessing as pp
+
+# Day key of rows whose Date Of Stop cannot be parsed
+UNDATED = ""
+
+
+def stop_days(column):
+    """Day of every row as (codes, day strings); rows without a parseable date are UNDATED."""
+    codes, dates = pp.parse_unique(column, pp.DATE_FORMATS)
+    days = dates.dt.strftime("%Y-%m-%d").fillna(UNDATED).to_numpy(dtype=object)
+    day_codes, day_values = pd.factorize(np.append(days, UNDATED))
+    # code -1 (missing date) picks the appended UNDATED entry
+    return day_codes[codes], np.asarray(day_values, dtype=object)
+
+
+def count_by_day(values, day_codes, day_values):
+    """Counts of the non-missing values per day: a Series indexed by (day, value)."""
+    value_codes, value_uniques = pd.factorize(values)
+    keep = value_codes >= 0
+    width = max(len(value_uniques), 1)
+    keys, counts = np.unique(day_codes[keep].astype(np.int64) * width + value_codes[keep], return_counts=True)
+    index = pd.MultiIndex.from_arrays(
+        [day_values[keys // width], np.asarray(value_uniques, dtype=object)[keys % width]], names=["day", "value"])
+    return pd.Series(counts, index=index, dtype="int64")
+
+
+class FrequencyCounter:
+    """Exact value counts of several columns, kept per Date Of Stop day.
+
+    Counters of chunks, partitions or shards combine with add(). update() lets a run's
+    counts replace the stored ones of every day that run saw, so counters persisted
+    between runs never count a re-loaded row twice (incremental runs re-read the
+    watermark day). totals() gives the value_counts a single-frame run over all
+    counted rows would compute, which is what the popularity thresholds need.
+    """
+
+    def __init__(self, counts=None, days=()):
+        self.counts = dict(counts or {})  # name -> Series indexed by (day, value)
+        self.days = set(days)
+
+    @classmethod
+    def count(cls, columns, dates):
+        """Counter of {name: values Series} for rows whose Date Of Stop (raw or parsed) is dates."""
+        day_codes, day_values = stop_days(dates)
+        counts = {name: count_by_day(values, day_codes, day_values) for name, values in columns.items()}
+        return cls(counts, day_values[np.unique(day_codes)] if len(day_codes) else ())
+
+    def add(self, other):
+        for name, counts in other.counts.items():
+            current = self.counts.get(name)
+            self.counts[name] = counts if current is None else current.add(counts, fill_value=0).astype("int64")
+        self.days |= other.days
+        return self
+
+    def update(self, other):
+        for name in set(self.counts) | set(other.counts):
+            current = self.counts.get(name)
+            if current is not None:
+                current = current[~current.index.get_level_values("day").isin(list(other.days))]
+            counts = other.counts.get(name)
+            self.counts[name] = current if counts is None else counts if current is None else pd.concat([current, counts])
+        self.days |= other.days
+        return self
+
+    def totals(self, name):
+        counts = self.counts.get(name)
+        if counts is None or counts.empty:
+            return pd.Series(dtype="int64")
+        totals = counts.groupby(level="value", sort=False).sum()
+        return totals.sort_values(ascending=False, kind="stable")
+
+    def save(self, path):
+        pd.to_pickle({"counts": self.counts, "days": sorted(self.days)}, path)
+        print(f"Frequency counts saved: {path} ({len(self.days)} days)")
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        stored = pd.read_pickle(path)
+        print(f"Frequency counts loaded: {path} ({len(stored['days'])} days)")
+        return cls(stored["counts"], stored["days"])
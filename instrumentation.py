@@ -0,0 +1,240 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+
+import pandas as pd
+
+# psutil when installed, /proc/self/statm (Linux) otherwise
+try:
+    import psutil
+    _process = psutil.Process()
+
+    def current_rss():
+        return _process.memory_info().rss
+except ImportError:
+    def current_rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+# RSS is sampled on a background thread while a step runs, to catch its peak
+SAMPLE_INTERVAL = 0.005
+
+# compare: a step regressed when it got this much slower (or bigger) and the difference is not noise
+REGRESSION_RATIO = 1.2
+MIN_SECONDS = 0.05
+MIN_MB = 16
+
+MB = 1024 ** 2
+
+
+class RssSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+# ------------------ Step records ------------------
+@dataclass
+class StepRecord:
+    name: str
+    calls: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    rss_start_mb: float = 0.0
+    rss_peak_mb: float = 0.0
+    rss_delta_mb: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    columns: dict = field(default_factory=dict)  # column -> {"nulled": n, "changed": n}
+
+    def add_columns(self, diffs):
+        for col, diff in diffs.items():
+            totals = self.columns.setdefault(col, {"nulled": 0, "changed": 0})
+            for key, value in diff.items():
+                totals[key] += value
+
+
+def column_changes(before, after, columns):
+    """Values a step nulled or changed in each of columns, for steps that keep the rows."""
+    if len(before) != len(after) or not before.index.equals(after.index):
+        return {}
+    diffs = {}
+    for col in columns:
+        if col not in after.columns:
+            continue
+        new = after[col]
+        if col not in before.columns:
+            diffs[col] = {"nulled": 0, "changed": int(new.notna().sum())}
+            continue
+        old = before[col]
+        old_na, new_na = old.isna().to_numpy(), new.isna().to_numpy()
+        both = ~old_na & ~new_na
+        if old.dtype == new.dtype:
+            differs = old.to_numpy(dtype=object, na_value=None) != new.to_numpy(dtype=object, na_value=None)
+        else:
+            # e.g. text parsed into dates: compare what the values print as
+            differs = old.astype(str).to_numpy() != new.astype(str).to_numpy()
+        diffs[col] = {"nulled": int((new_na & ~old_na).sum()), "changed": int((differs & both).sum())}
+    return diffs
+
+
+# ------------------ Run report ------------------
+class RunReport:
+    """Collects one StepRecord per pipeline step; disabled reports just run the steps.
+
+    Steps that run several times (every partition in streaming mode) are summed into
+    one record, with the peak RSS kept as the maximum. profile is a list of step name
+    substrings ("all" for every step) that also run under cProfile.
+    """
+
+    def __init__(self, enabled=True, profile=None, profile_dir="."):
+        self.enabled = enabled or bool(profile)
+        self.profile = profile or []
+        self.profile_dir = profile_dir
+        self.records = {}
+        self.started = time.time()
+
+    def wants_profile(self, name):
+        return any(p == "all" or p.lower() in name.lower() for p in self.profile)
+
+    def run(self, name, func, data, columns=()):
+        if not self.enabled:
+            return func(data)
+
+        rows_in = len(data) if data is not None else 0
+        before = data[[c for c in columns if c in data.columns]].copy() if columns else None
+        profiler = cProfile.Profile() if self.wants_profile(name) else None
+
+        rss_start = current_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        with RssSampler() as sampler:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = func(data)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+        record = self.records.setdefault(name, StepRecord(name))
+        record.calls += 1
+        record.wall_s += wall
+        record.cpu_s += cpu
+        record.rss_start_mb = record.rss_start_mb or rss_start / MB
+        record.rss_peak_mb = max(record.rss_peak_mb, sampler.peak / MB)
+        record.rss_delta_mb += (current_rss() - rss_start) / MB
+        record.rows_in += rows_in
+        record.rows_out += len(result) if result is not None else 0
+        if before is not None and result is not None:
+            record.add_columns(column_changes(before, result, columns))
+        if profiler is not None:
+            self.save_profile(name, profiler)
+        return result
+
+    def save_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, re.sub(r"\W+", "_", name).strip("_").lower() + ".prof")
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        print(f"Profile of {name} saved: {path}\n{out.getvalue()}")
+
+    def to_dict(self, **meta):
+        steps = [asdict(record) for record in self.records.values()]
+        return {
+            **meta,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "total_wall_s": sum(step["wall_s"] for step in steps),
+            "peak_rss_mb": max((step["rss_peak_mb"] for step in steps), default=0.0),
+            "steps": steps,
+        }
+
+    def save(self, path, **meta):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(**meta), f, indent=2, default=str)
+        print(f"Run report saved: {path}")
+
+    def summary(self):
+        rows = pd.DataFrame([asdict(r) for r in self.records.values()]).drop(columns="columns")
+        return rows.set_index("name").round(2)
+
+
+NO_REPORT = RunReport(enabled=False)
+
+
+# ------------------ Comparing reports ------------------
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, ratio=REGRESSION_RATIO, min_seconds=MIN_SECONDS, min_mb=MIN_MB):
+    """Step-by-step comparison; a step regressed when its wall time or peak RSS grew by
+    more than ratio and by more than the noise floors min_seconds / min_mb."""
+    base = {step["name"]: step for step in baseline["steps"]}
+    rows = []
+    for step in current["steps"]:
+        old = base.get(step["name"])
+        if old is None:
+            rows.append({"step": step["name"], "wall_s": step["wall_s"], "baseline_wall_s": None,
+                         "peak_mb": step["rss_peak_mb"], "baseline_peak_mb": None, "status": "new"})
+            continue
+        slower = (step["wall_s"] > old["wall_s"] * ratio and step["wall_s"] - old["wall_s"] > min_seconds)
+        bigger = (step["rss_peak_mb"] > old["rss_peak_mb"] * ratio
+                  and step["rss_peak_mb"] - old["rss_peak_mb"] > min_mb)
+        status = " + ".join(s for s, flag in (("slower", slower), ("more memory", bigger)) if flag)
+        rows.append({"step": step["name"], "wall_s": step["wall_s"], "baseline_wall_s": old["wall_s"],
+                     "peak_mb": step["rss_peak_mb"], "baseline_peak_mb": old["rss_peak_mb"],
+                     "status": f"REGRESSED ({status})" if status else "ok"})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a pipeline run report against a baseline report")
+    parser.add_argument("command", choices=["compare"])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO)
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    parser.add_argument("--min-mb", type=float, default=MIN_MB)
+    args = parser.parse_args(argv)
+
+    result = compare_reports(load_report(args.baseline), load_report(args.current),
+                             args.ratio, args.min_seconds, args.min_mb)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.2f}".format):
+        print(result.to_string(index=False))
+
+    regressed = result["status"].str.startswith("REGRESSED").sum()
+    print(f"{regressed} of {len(result)} steps regressed")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
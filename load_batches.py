@@ -0,0 +1,92 @@
+from sqlalchemy import text
+
+# Every load_to_database call is one load batch: its rows carry the batch id in
+# traffic_violations.load_batch (upserts set it on the rows they change). A batch is
+# completed in the transaction that moves its rows into traffic_violations, so a load
+# still copying (or one that failed) is never completed. refresh_rollups publishes the
+# batches completed before it refreshed, numbering each publication in order, and the
+# dashboard only fetches the rows of batches published since the publication it last saw.
+# Batch ids are taken when a load starts and loads can finish in any order, which is why
+# the dashboard follows publications and not batch ids.
+TABLE = "load_batches"
+DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    batch_id BIGSERIAL PRIMARY KEY,
+    rows BIGINT,
+    loaded_at TIMESTAMP DEFAULT now(),
+    completed_at TIMESTAMP,
+    published_at TIMESTAMP,
+    publication BIGINT
+)
+"""
+PUBLICATIONS = "load_batch_publications"
+
+
+def create_batch_columns(conn, table="traffic_violations"):
+    """Create the batch table and sequence and add load_batch to table; part of schema
+    setup (schema.py), as ALTER TABLE locks out every reader of table until commit."""
+    # Rows loaded before batches existed keep a NULL batch and count as already published
+    conn.execute(text(DDL))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP, "
+                      f"ADD COLUMN IF NOT EXISTS publication BIGINT"))
+    conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {PUBLICATIONS}"))
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS load_batch BIGINT"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_load_batch ON {table} (load_batch)"))
+
+
+def has_batch_columns(conn, table="traffic_violations"):
+    # Catalog reads only: no lock on table
+    return conn.execute(text("""
+        SELECT to_regclass(:sequence) IS NOT NULL AND (
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND ((table_name = :table AND column_name = 'load_batch')
+                   OR (table_name = :batches AND column_name IN ('completed_at', 'publication')))
+        ) = 3
+        """), {"sequence": PUBLICATIONS, "table": table, "batches": TABLE}).scalar()
+
+
+def start_batch(conn, rows):
+    if not has_batch_columns(conn):
+        # first load into a table set up before batches: once, outside any refresh
+        create_batch_columns(conn)
+    return conn.execute(text(f"INSERT INTO {TABLE} (rows) VALUES (:rows) RETURNING batch_id"),
+                        {"rows": rows}).scalar()
+
+
+def complete_batch(conn, batch_id):
+    # Call in the transaction that writes the batch's rows into traffic_violations
+    conn.execute(text(f"UPDATE {TABLE} SET completed_at = now() WHERE batch_id = :batch_id"),
+                 {"batch_id": batch_id})
+
+
+def discard_batch(conn, batch_id):
+    # A failed load wrote no rows; its batch must never be published
+    conn.execute(text(f"DELETE FROM {TABLE} WHERE batch_id = :batch_id AND completed_at IS NULL"),
+                 {"batch_id": batch_id})
+
+
+def completed_batches(conn):
+    """Ids of the completed, unpublished batches; read before the rollups are refreshed."""
+    if not has_batch_columns(conn):
+        return []
+    return list(conn.execute(text(f"SELECT batch_id FROM {TABLE} "
+                                  f"WHERE completed_at IS NOT NULL AND published_at IS NULL")).scalars())
+
+
+def publish_batches(conn, batch_ids):
+    # Refreshes publish one after the other: REFRESH ... CONCURRENTLY holds its lock until
+    # commit, so publication numbers become visible in order
+    if not batch_ids:
+        return 0
+    return conn.execute(text(f"""
+        UPDATE {TABLE} SET published_at = now(), publication = nextval('{PUBLICATIONS}')
+        WHERE batch_id = ANY(:batch_ids) AND published_at IS NULL
+        """), {"batch_ids": list(batch_ids)}).rowcount
+
+
+def published_batch(conn):
+    """Number of the latest publication, 0 before the first one."""
+    if not has_batch_columns(conn):
+        return 0
+    return conn.execute(text(f"SELECT COALESCE(MAX(publication), 0) FROM {TABLE}")).scalar()
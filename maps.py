@@ -193,14 +193,15 @@ dtype_map = {
     "Driver State": "string",
     "DL State": "string",
     "Arrest Type": "string",
-    "Geolocation": "string",
         
     # Float Columns
     "Latitude": "float64",
     "Longitude": "float64",
 
-    # Integer Column
-    "Year": "Int64"
+    # Integer Columns
+    "Year": "Int64",
+    "Flags": "int16",
+    "Flags Known": "int16"
 }
 
 
@@ -239,8 +240,56 @@ boolean_columns = [
     'Alcohol','Work Zone', 'Search Conducted'
 ]
 
+# Bit of every boolean column in the packed Flags column (set when True); Flags Known
+# has the same bit set when the value is not missing. 11 bits fit a SMALLINT.
+flag_bits = {col: 1 << i for i, col in enumerate(boolean_columns)}
+
 # Other Columns
 other_columns = [
     'Violation Type', 'Arrest Type', 'Article',
     'Race', 'Gender', 'Contributed To Accident'
-]
\ No newline at end of file
+]
+
+# ------------------ Memory-optimized dtype plan ------------------
+# Arrow-backed strings when pyarrow is installed, plain pandas strings otherwise
+try:
+    import pyarrow  # noqa: F401
+    text_dtype = "string[pyarrow]"
+except ImportError:
+    text_dtype = "string"
+
+# Low-cardinality text columns, stored as category
+category_columns = [
+    'Agency', 'SubAgency', 'Search Disposition', 'Search Outcome', 'Search Reason',
+    'Search Reason For Stop', 'Search Type', 'Search Arrest Reason', 'State',
+    'VehicleType', 'Vehicle Code', 'Vehicle Category', 'Make', 'Color',
+    'Violation Type', 'Article', 'Contributed To Accident', 'Race', 'Gender',
+    'Driver City', 'Driver State', 'DL State', 'Arrest Type'
+]
+
+# High-cardinality free text, stored as text_dtype
+text_columns = [
+    'SeqID', 'Description', 'Location', 'Time Of Stop', 'Model', 'Charge'
+]
+
+# Raw columns that are not read at all: Geolocation only repeats Latitude/Longitude as
+# "(lat, lon)" text. The sinks rebuild it from the cleaned coordinates instead: a generated
+# POINT column in PostgreSQL, a (longitude, latitude) struct in Parquet.
+skipped_columns = ['Geolocation']
+
+# Final dtypes of the cleaned frame
+compact_dtype_map = {
+    **dtype_map,
+    **{col: "category" for col in category_columns},
+    **{col: text_dtype for col in text_columns},
+    **{col: "boolean" for col in boolean_columns},
+}
+
+# Dtypes used by load_csv: every raw text column repeats a small set of values
+# before cleaning, so they are all read as category (SeqID is unique per row)
+read_dtype_map = {
+    **{col: "category" for col in category_columns + text_columns + boolean_columns
+       if col not in ('SeqID', 'Vehicle Code', 'Vehicle Category')},
+    'Date Of Stop': "category",
+    'SeqID': text_dtype,
+}
@@ -0,0 +1,418 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import fields
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import arrow_cache
+import spatial
+from bitmap_index import FilterIndex
+from dashboard_queries import FILTER_COLUMNS, WORLD_LATITUDE, WORLD_LONGITUDE, merge_fragments, run_concurrently
+from rollups import FLAG_BITS
+
+# Hive-style directories stop_year=YYYY/stop_month=M; "year" is already the vehicle year
+PARTITION_COLUMNS = ["stop_year", "stop_month"]
+# Written last into a complete dataset; holds the version the dashboard processes compare
+# (pyarrow skips files starting with "_" when it lists the dataset)
+COMPLETE_MARKER = "_COMPLETE"
+# Partition of the rows without a Date Of Stop: a null partition key makes readers that
+# dictionary-encode the keys (pd.read_parquet) fail, and 0 fails every year filter just the same
+UNDATED_PARTITION = 0
+ROW_GROUP_ROWS = 128_000
+COMPRESSION = "zstd"
+
+# Columns of the in-memory copy IndexedDataset answers filtered charts from
+MEMORY_COLUMNS = ["date_of_stop", *FILTER_COLUMNS, "make", "vehicletype", "latitude", "longitude", "flags"]
+
+# How often a dashboard process looks for a rewritten dataset
+VERSION_CHECK_SECONDS = 30
+
+
+def column_name(column):
+    # Same names as the traffic_violations table, so both dashboard backends share them
+    return column.lower().replace(" ", "_")
+
+
+# ------------------ Writing ------------------
+def geolocation_pairs(latitude, longitude):
+    # (longitude, latitude) as a struct built from the two float buffers without a Python
+    # object per row; null when either coordinate is missing. A masked fixed-size list
+    # would be written with empty lists for the null rows, which Parquet cannot read back.
+    lon, lat = longitude.to_numpy(dtype=float), latitude.to_numpy(dtype=float)
+    missing = np.isnan(lon) | np.isnan(lat)
+    return pa.StructArray.from_arrays([pa.array(lon), pa.array(lat)], names=["longitude", "latitude"],
+                                      mask=pa.array(missing))
+
+
+def is_dataset(path):
+    # Only an empty directory or one of stop_year= partitions is ever replaced
+    return os.path.isdir(path) and all(name.startswith("stop_year=") or name == COMPLETE_MARKER
+                                       for name in os.listdir(path))
+
+
+def dataset_version(path):
+    # None while path holds no complete dataset: never written, or in the middle of a swap
+    try:
+        with open(os.path.join(path, COMPLETE_MARKER)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def check_target(path):
+    if os.path.exists(path) and not is_dataset(path):
+        print(f"Error: {path} is not a Parquet dataset written by --parquet; not overwriting it")
+        exit(1)
+
+
+def begin_dataset(path):
+    """Staging directory next to path that a new dataset is written to; path keeps the
+    previous dataset until finish_dataset swaps the new one in."""
+    check_target(path)
+    parent, name = os.path.split(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f".{name}.staging-", dir=parent)
+
+
+def finish_dataset(staging, path):
+    # A directory is only renamed onto an empty one, so the previous dataset is moved
+    # aside first; readers never see a partly written dataset at path
+    check_target(path)
+    with open(os.path.join(staging, COMPLETE_MARKER), "w") as f:
+        f.write(uuid.uuid4().hex)
+    parent, name = os.path.split(os.path.abspath(path))
+    previous = None
+    if os.path.exists(path):
+        previous = tempfile.mkdtemp(prefix=f".{name}.previous-", dir=parent)
+        os.replace(path, previous)
+    os.replace(staging, path)
+    if previous is not None:
+        shutil.rmtree(previous)
+    print(f"Parquet dataset in place: {path}")
+
+
+def write_dataset(df, path, basename="part"):
+    """Append df to the Parquet dataset at path, partitioned by year and month of Date Of Stop.
+
+    Rows are sorted by date first, so the min/max statistics of every row group cover
+    a narrow date range and date filters can skip row groups, not just partitions.
+    Call once per streamed partition with a distinct basename.
+    """
+    df = df.sort_values("Date Of Stop", kind="stable")
+    dates = df["Date Of Stop"]
+    # renamed before conversion so the pandas metadata (dtype_map types) matches the column names
+    table = pa.Table.from_pandas(df.rename(columns=column_name), preserve_index=False)
+    table = table.append_column("stop_year", pa.array(dates.dt.year.fillna(UNDATED_PARTITION), type=pa.int16()))
+    table = table.append_column("stop_month", pa.array(dates.dt.month.fillna(UNDATED_PARTITION), type=pa.int8()))
+    table = table.append_column("geolocation", geolocation_pairs(df["Latitude"], df["Longitude"]))
+
+    file_format = ds.ParquetFileFormat()
+    ds.write_dataset(
+        table, path,
+        format=file_format,
+        partitioning=ds.partitioning(table.select(PARTITION_COLUMNS).schema, flavor="hive"),
+        basename_template=f"{basename}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=file_format.make_write_options(compression=COMPRESSION, write_statistics=True),
+        max_rows_per_group=ROW_GROUP_ROWS,
+        min_rows_per_group=min(ROW_GROUP_ROWS, max(1, table.num_rows)),
+    )
+    print(f"Parquet written: {path} ({table.num_rows} rows)")
+
+
+def compact_dataset(path):
+    """Rewrite every year/month directory that holds several files as one sorted file.
+
+    Streaming mode writes one file per spill partition into every month it touches;
+    merging them keeps the file count, and the per-file cost of every scan, low.
+    """
+    merged = 0
+    for directory, _, files in os.walk(path):
+        parts = sorted(f for f in files if f.endswith(".parquet"))
+        if len(parts) < 2:
+            continue
+        table = ds.dataset([os.path.join(directory, f) for f in parts], format="parquet").to_table()
+        table = table.sort_by("date_of_stop")
+        pq.write_table(table, os.path.join(directory, "merged.parquet.tmp"), compression=COMPRESSION,
+                       write_statistics=True, row_group_size=ROW_GROUP_ROWS)
+        for f in parts:
+            os.remove(os.path.join(directory, f))
+        os.replace(os.path.join(directory, "merged.parquet.tmp"), os.path.join(directory, "part-0.parquet"))
+        merged += 1
+    print(f"Parquet compacted: {merged} partitions merged into one file each")
+
+
+# ------------------ Dashboard backend ------------------
+# Same functions as dashboard_queries with a pyarrow dataset in place of the engine.
+# Only the columns a chart needs are read. The sidebar filters are answered from the
+# indexed in-memory copy of an IndexedDataset; on a plain dataset they become a dataset
+# filter that prunes year/month directories and row groups before anything is decoded.
+
+class MemoryCopy:
+    """The dashboard columns of a dataset sorted by date, with their indexes.
+
+    Filtered charts are answered from the copy instead of a scan: the date range is a
+    binary search, every multiselect a bitmap per selected value (bitmap_index.FilterIndex)
+    and a latitude/longitude box the rows of the grid cells it overlaps (spatial.GridIndex).
+    """
+
+    def __init__(self, table, filter_index, grid, grid_rows, latitude, longitude):
+        self.table = table
+        self.filter_index = filter_index
+        self.grid = grid
+        self.grid_rows = grid_rows  # rows with coordinates, in grid cell order
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def build(cls, dataset):
+        table = dataset.to_table(columns=[col for col in MEMORY_COLUMNS if col in dataset.schema.names])
+        table = table.sort_by("date_of_stop")
+        latitude, longitude = table["latitude"].to_numpy(), table["longitude"].to_numpy()
+        located = np.flatnonzero(~np.isnan(latitude) & ~np.isnan(longitude))
+        grid, order = spatial.GridIndex.build(latitude[located], longitude[located])
+        return cls(table, FilterIndex.build(table, "date_of_stop", FILTER_COLUMNS), grid, located[order],
+                   latitude, longitude)
+
+    # Stored in the shared Arrow cache as the table, named arrays and a JSON dict
+    def entry(self):
+        arrays, values = self.filter_index.arrays()
+        arrays.update({"grid.keys": self.grid.keys, "grid.rows": self.grid_rows,
+                       "latitude": self.latitude, "longitude": self.longitude})
+        grid = {f.name: getattr(self.grid, f.name) for f in fields(self.grid) if f.name != "keys"}
+        return self.table, arrays, {"values": values, "grid": grid}
+
+    @classmethod
+    def from_entry(cls, table, arrays, meta):
+        grid = spatial.GridIndex(keys=arrays["grid.keys"], **meta["grid"])
+        return cls(table, FilterIndex.from_arrays(arrays, meta["values"]), grid, arrays["grid.rows"],
+                   arrays["latitude"], arrays["longitude"])
+
+    def box_rows(self, latitude_range, longitude_range):
+        ranges = self.grid.ranges(latitude_range, longitude_range)
+        rows = np.concatenate([self.grid_rows[start:stop] for start, stop in ranges] or [np.zeros(0, dtype=np.int64)])
+        # points of the edge cells can lie just outside the box
+        lat, lon = self.latitude[rows], self.longitude[rows]
+        inside = ((lat >= latitude_range[0]) & (lat <= latitude_range[1])
+                  & (lon >= longitude_range[0]) & (lon <= longitude_range[1]))
+        return rows[inside]
+
+    def read(self, columns, filters):
+        date_range = None
+        if filters.start_date is not None:
+            date_range = (pd.Timestamp(filters.start_date).value, pd.Timestamp(filters.end_date).value)
+        candidates = []
+        if filters.uses_coordinates:
+            candidates.append(self.box_rows(filters.latitude_range or WORLD_LATITUDE,
+                                            filters.longitude_range or WORLD_LONGITUDE))
+        rows, mask = self.filter_index.select(
+            date_range, {col: getattr(filters, col) for col in FILTER_COLUMNS}, candidates)
+        table = self.table.select(columns).slice(rows.start, rows.stop - rows.start)
+        return table.filter(mask) if mask is not None else table
+
+
+class IndexedDataset:
+    """A pyarrow dataset plus its MemoryCopy, shared by the dashboard processes of the host.
+
+    The copy is written once per dataset version to an Arrow IPC file (and .npy index
+    arrays) under cache_dir, and every process memory-maps it instead of holding its
+    own. The version is the one in the dataset's COMPLETE_MARKER: when main.py swaps a
+    new dataset in, the next check (every VERSION_CHECK_SECONDS) builds its copy and
+    only then replaces the current dataset and copy, which stay in use if that fails.
+    """
+
+    def __init__(self, path, cache_dir=arrow_cache.CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._memory = None
+        found = self.discover()
+        if found is None:
+            raise FileNotFoundError(f"No complete Parquet dataset at {path}; write one with main.py --parquet")
+        self.dataset, self.version = found
+        self._checked = time.monotonic()
+
+    def discover(self):
+        # The marker is read before and after listing the files, so a dataset swapped in
+        # meanwhile is not taken for the previous version
+        version = dataset_version(self.path)
+        if version is None:
+            return None
+        dataset = ds.dataset(self.path, format="parquet", partitioning="hive")
+        if dataset_version(self.path) != version:
+            return None
+        # the columns are part of the version, so a copy of other columns is never reused
+        return dataset, hashlib.sha1(f"{version}\0{','.join(MEMORY_COLUMNS)}".encode()).hexdigest()[:16]
+
+    def build_memory(self, dataset, version):
+        entry = arrow_cache.get_or_build(version, lambda: MemoryCopy.build(dataset).entry(), self.cache_dir,
+                                         previous=self.version)
+        return MemoryCopy.from_entry(*entry)
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and time.monotonic() - self._checked < VERSION_CHECK_SECONDS:
+                return
+            self._checked = time.monotonic()
+            found = self.discover()
+            if found is None or found[1] == self.version:
+                return
+            dataset, version = found
+            try:
+                # readers holding the previous copy finish with it; new reads get the new one
+                memory = self.build_memory(dataset, version) if self._memory is not None else None
+            except (OSError, pa.ArrowException) as e:
+                print(f"Parquet dataset version {version} not readable, keeping {self.version}: {e}")
+                return
+            print(f"Parquet dataset changed: {self.path} (version {version})")
+            self.dataset, self.version, self._memory = dataset, version, memory
+
+    def to_table(self, columns=None, filter=None):
+        self.refresh()
+        try:
+            return self.dataset.to_table(columns=columns, filter=filter)
+        except FileNotFoundError:
+            # the files were replaced by a newer dataset since the last check
+            self.refresh(force=True)
+            return self.dataset.to_table(columns=columns, filter=filter)
+
+    def memory(self):
+        self.refresh()
+        with self._lock:
+            if self._memory is None:
+                self._memory = self.build_memory(self.dataset, self.version)
+            return self._memory
+
+    def read_filtered(self, columns, filters):
+        return self.memory().read(columns, filters)
+
+
+def open_dataset(path, cache_dir=arrow_cache.CACHE_DIR):
+    return IndexedDataset(path, cache_dir)
+
+
+def filter_expression(filters):
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if filters.start_date is not None:
+        start, end = pd.Timestamp(filters.start_date), pd.Timestamp(filters.end_date)
+        add((ds.field("stop_year") >= start.year) & (ds.field("stop_year") <= end.year))
+        add((ds.field("date_of_stop") >= start) & (ds.field("date_of_stop") <= end))
+    for col in FILTER_COLUMNS:
+        values = getattr(filters, col)
+        if values:
+            add(ds.field(col).isin(list(values)))
+    for col, bounds in (("latitude", filters.latitude_range), ("longitude", filters.longitude_range)):
+        if bounds is not None:
+            add((ds.field(col) >= bounds[0]) & (ds.field(col) <= bounds[1]))
+    return expression
+
+
+def read(dataset, columns, filters=None):
+    if filters is not None and isinstance(dataset, IndexedDataset) and set(columns) <= set(MEMORY_COLUMNS):
+        return dataset.read_filtered(columns, filters).to_pandas()
+    expression = filter_expression(filters) if filters is not None else None
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def counts(column):
+    return column.value_counts(sort=True).loc[lambda s: s > 0]
+
+
+def flag_is_set(flags, name):
+    return (flags.to_numpy() & FLAG_BITS[name]) != 0
+
+
+# Startup queries: one column each, read concurrently (pyarrow decodes without the GIL)
+def fetch_totals(dataset):
+    flags = read(dataset, ["flags"])["flags"]
+    return {"total": len(flags), "accidents": int(flag_is_set(flags, "accident").sum())}
+
+
+def fetch_top_value(dataset, column):
+    top_values = counts(read(dataset, [column])[column])
+    return {column: top_values.index[0] if not top_values.empty else "N/A"}
+
+
+def fetch_options(dataset, column):
+    return {column: sorted(read(dataset, [column])[column].dropna().unique())}
+
+
+def fetch_min_date(dataset):
+    dates = dataset.to_table(columns=["date_of_stop"])["date_of_stop"]
+    return {"min_date": pd.Timestamp(pc.min(dates).as_py()).date()}
+
+
+def summary_tasks(dataset):
+    return {
+        "totals": partial(fetch_totals, dataset),
+        **{f"top {col}": partial(fetch_top_value, dataset, col) for col in ["location", "make", "model"]},
+    }
+
+
+def option_tasks(dataset):
+    return {
+        **{f"{col} options": partial(fetch_options, dataset, col) for col in FILTER_COLUMNS},
+        "min date": partial(fetch_min_date, dataset),
+        "coordinate bounds": lambda: {"bounds": fetch_coordinate_bounds(dataset)},
+    }
+
+
+def fetch_summary(dataset):
+    return merge_fragments(run_concurrently(summary_tasks(dataset))[0])
+
+
+def fetch_published_batch(dataset):
+    # The dataset is rewritten as a whole, so its version stands in for a load batch
+    dataset.refresh()
+    return dataset.version
+
+
+def fetch_filter_options(dataset):
+    return merge_fragments(run_concurrently(option_tasks(dataset))[0])
+
+
+def fetch_trend(dataset, filters):
+    dates = read(dataset, ["date_of_stop"], filters)["date_of_stop"].dropna()
+    trend = dates.dt.to_period("M").dt.to_timestamp().value_counts().sort_index()
+    return pd.DataFrame({"date_of_stop": trend.index, "count": trend.to_numpy()})
+
+
+def fetch_top(dataset, column, filters, limit=10):
+    return counts(read(dataset, [column], filters)[column]).head(limit).rename("count")
+
+
+def fetch_vehicle_types(dataset, filters):
+    df = read(dataset, ["vehicletype", "latitude", "longitude", "flags"], filters)
+    df = df.dropna(subset=["latitude", "longitude", "vehicletype"])
+    df = df.assign(accident=flag_is_set(df["flags"], "accident"))
+    vehicle_types = df.groupby(["vehicletype", "accident"], observed=True).size()
+    return vehicle_types.sort_values(ascending=False).rename("count").reset_index()
+
+
+def fetch_heatmap(dataset, filters):
+    df = read(dataset, ["latitude", "longitude", "flags"], filters)
+    cells = spatial.bin_points(df["latitude"], df["longitude"], flag_is_set(df["flags"], "accident"))
+    return spatial.TilePyramid.from_cells(cells)
+
+
+def fetch_coordinate_bounds(dataset):
+    table = dataset.to_table(columns=["latitude", "longitude"])
+    lat, lon = pc.min_max(table["latitude"]), pc.min_max(table["longitude"])
+    return pd.Series({"lat_min": lat["min"].as_py(), "lat_max": lat["max"].as_py(),
+                      "lon_min": lon["min"].as_py(), "lon_max": lon["max"].as_py()}, dtype=float)
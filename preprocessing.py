@@ -2,42 +2,154 @@ import pandas as pd
 import numpy as np
 
 # ------------------ Utility ------------------
-def to_upper_strip(column):
+# Normalized value of every distinct input seen so far, one dict per normalization chain.
+# Kept for the whole run so later partitions and repeated calls only normalize new values;
+# a chain's dict is cleared once it holds more than NORMALIZE_CACHE_SIZE values.
+NORMALIZE_CACHE_SIZE = 200_000
+_normalized = {}
+_MISSING = ('missing',)
+
+
+def factorize_column(column):
+    """Codes and distinct values of column; missing values get the extra last code, whose value is NaN."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        uniques = column.cat.categories.to_numpy(dtype=object)
+    else:
+        codes, uniques = pd.factorize(column)
+        uniques = np.asarray(uniques, dtype=object)
+    codes = np.where(codes < 0, len(uniques), codes)
+    return codes, np.append(uniques, np.array([np.nan], dtype=object))
+
+
+def normalize_unique(column, func, key):
+    """Run func (a Series -> Series chain) on the distinct values of column only and expand by code.
+
+    key names the chain (including any mapping it uses) in the per-run cache, so values
+    normalized by an earlier call with the same key are not normalized again.
+    """
+    codes, uniques = factorize_column(column)
+    cache = _normalized.setdefault(key, {})
+    if len(cache) > NORMALIZE_CACHE_SIZE:
+        cache.clear()
+
+    # (type, value) so that e.g. 1, 1.0 and True stay distinct entries
+    keys = [(type(value), value) for value in uniques[:-1]] + [_MISSING]
+    todo = [i for i, k in enumerate(keys) if k not in cache]
+    if todo:
+        fresh = func(pd.Series(uniques[todo], dtype=object)).to_numpy(dtype=object)
+        for i, value in zip(todo, fresh):
+            cache[keys[i]] = value
+
+    values = np.fromiter((cache[k] for k in keys), dtype=object, count=len(keys))
+    return pd.Series(values[codes], index=column.index, name=column.name, dtype=object)
+
+
+def upper_strip(values):
     return (
-        column.astype(str)
+        values.astype(str)
         .str.strip()
         .str.upper()
         .replace({'NAN': np.nan, 'NONE': np.nan, '': np.nan})
     )
 
+
+def to_upper_strip(column):
+    return normalize_unique(column, upper_strip, 'upper_strip')
+
+
+# Explicit formats tried before falling back to the slow per-element parser
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d']
+TIME_FORMATS = ['%H:%M:%S', '%H:%M']
+# strptime's %M/%S also take one digit; times like '7:5' are malformed, not 07:05
+TIME_PATTERN = r'^\d{1,2}:\d{2}(:\d{2})?$'
+
+
+def parse_unique(column, formats, fallback_format='mixed', prepare=None):
+    """Parse every distinct value of column once.
+
+    Returns the factorize codes of column and a datetime Series with one entry per
+    distinct value. Each explicit format only sees the values the previous ones could
+    not parse; whatever is left goes through fallback_format (None: stays NaT).
+    """
+    codes, uniques = pd.factorize(column)
+    values = pd.Series(np.asarray(uniques, dtype=object))
+    if prepare is not None:
+        values = prepare(values)
+
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in formats + ([fallback_format] if fallback_format else []):
+        todo = parsed.isna() & values.notna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(values[todo], format=fmt, errors='coerce')
+
+    return codes, parsed
+
+
+def take_by_code(values, codes, fill):
+    # code -1 (missing) picks the fill value appended at the end
+    return np.append(np.asarray(values), np.array([fill], dtype=np.asarray(values).dtype))[codes]
+
+
+
 # ----------------- SeqID, Description,Charge----------------------#
 
-def merge_duplicates(df, id_col='SeqID', description_col='Description', charge_col='Charge',
-                     desc_sep=' | ', charge_sep=','):
+def join_unique_per_group(codes, values, n_groups, sep):
+    """Join the distinct non-null values of every group in order of first appearance.
 
-    df.drop_duplicates(inplace=True)
-    # Step 1: Converting description & charge columns to string and cleaning 
-    df[description_col] = to_upper_strip(df[description_col])
-    df[description_col] = df[description_col].str.lstrip(',| )]\\')
-    df[charge_col] = df[charge_col].astype(str)
+    codes are group codes in order of first appearance (-1 = no group). Instead of a
+    Python call per group, (group, value) pairs are factorized into one integer key,
+    deduplicated, stably sorted by group and concatenated once per segment.
+    """
+    joined = np.full(n_groups, '', dtype=object)
+
+    value_codes, uniques = pd.factorize(values)
+    keep = (codes >= 0) & (value_codes >= 0)
+    if not keep.any():
+        return joined
 
-    # Step 2: Merge duplicates based on ID
-    merged = (
-        df.groupby(id_col, sort=False, as_index=False)
-        .agg({
-          description_col: lambda x: desc_sep.join(str(i) for i in pd.unique(x) if pd.notna(i)),
-          charge_col: lambda x: charge_sep.join(str(i) for i in pd.unique(x) if pd.notna(i))
-        })
-)
+    n_values = len(uniques)
+    keys = pd.unique(codes[keep].astype(np.int64) * n_values + value_codes[keep])
+    group = keys // n_values
+    order = np.argsort(group, kind='stable')
+    group = group[order]
+    value = (keys % n_values)[order]
 
+    uniques = np.asarray(uniques, dtype=object)
+    # every value except the last one of its group gets the separator appended
+    is_last = np.append(group[1:] != group[:-1], True)
+    pieces = np.where(is_last, uniques[value], (uniques + sep)[value])
 
-    # Step 3: Keep first occurrence of other columns
-    df_unique = df.drop_duplicates(subset=id_col, keep='first')
-    df_unique = df_unique.drop(columns=[description_col, charge_col])
+    starts = np.flatnonzero(np.append(True, group[1:] != group[:-1]))
+    joined[group[starts]] = np.add.reduceat(pieces, starts)
+    return joined
 
-    # Step 4: Merge cleaned D ?escriptions and Charges back
-    df_clean = df_unique.merge(merged[[id_col, description_col, charge_col]],
-                               on=id_col, how='left')
+
+def merge_duplicates(df, id_col='SeqID', description_col='Description', charge_col='Charge',
+                     desc_sep=' | ', charge_sep=','):
+
+    # Step 1: Converting description & charge columns to string and cleaning 
+    description = normalize_unique(df[description_col], lambda s: upper_strip(s).str.lstrip(',| )]\\'),
+                                   'description')
+    charge = normalize_unique(df[charge_col], lambda s: s.astype(str), 'str')
+
+    # Step 2: Merge duplicates based on ID (codes follow the order of first appearance)
+    codes, seq_ids = pd.factorize(df[id_col])
+    merged_description = join_unique_per_group(codes, description.to_numpy(dtype=object), len(seq_ids), desc_sep)
+    merged_charge = join_unique_per_group(codes, charge.to_numpy(dtype=object), len(seq_ids), charge_sep)
+
+    # Step 3: Keep first occurrence of other columns (a missing SeqID keeps one row without Description/Charge)
+    first_rows = np.flatnonzero(~df[id_col].duplicated().to_numpy())
+    df_clean = df.drop(columns=[description_col, charge_col]).iloc[first_rows].reset_index(drop=True)
+
+    # Step 4: Put cleaned Descriptions and Charges back
+    first_codes = codes[first_rows]
+    has_id = first_codes >= 0
+    for col, merged in ((description_col, merged_description), (charge_col, merged_charge)):
+        values = np.full(len(first_rows), np.nan, dtype=object)
+        values[has_id] = merged[first_codes[has_id]]
+        df_clean[col] = values
 
     return df_clean
 
@@ -46,38 +158,43 @@ def merge_duplicates(df, id_col='SeqID', description_col='Description', charge_c
 def clean_date_of_stop(df, column='Date Of Stop', min_year=1990):
     today = pd.Timestamp.today().normalize()
 
-    df[column] = pd.to_datetime(
-        df[column],
-        errors='coerce',
-        format='mixed'
-    )
+    codes, dates = parse_unique(df[column], DATE_FORMATS)
 
     mask = (
-        df[column].notna() &
-        (df[column] <= today) &
-        (df[column].dt.year.between(min_year, today.year))
+        dates.notna() &
+        (dates <= today) &
+        (dates.dt.year.between(min_year, today.year))
     )
+    dates = dates.where(mask)
 
-    df.loc[~mask, column] = pd.NaT
+    df[column] = pd.Series(take_by_code(dates, codes, np.datetime64('NaT')), index=df.index)
     return df
 
+def filter_since(df, since, column='Date Of Stop'):
+    # Keep rows on or after since; rows whose date cannot be parsed are kept too,
+    # they cannot be placed relative to the watermark
+    codes, dates = parse_unique(df[column], DATE_FORMATS)
+    keep = take_by_code(dates.isna() | (dates >= since), codes, True)
+    return df[keep]
+
 # ---------------------- Time Of Stop, Timestamp--------------------#
 
 def clean_time_of_stop(df, time_col='Time Of Stop', date_col='Date Of Stop', timestamp_col='Timestamp'):
 
-    
-    # Step 1: Remove inconsistencies in the time column
-    df[time_col] = df[time_col].astype(str).str.strip().str.replace('.', ':', regex=False)
-    
-    # Step 2: Convert to proper time format
-    df[time_col] = pd.to_datetime(df[time_col], errors='coerce').dt.time
-    
-    # Step 3: Create combined timestamp column
-    df[timestamp_col] = pd.to_datetime(
-        df[date_col].astype(str) + ' ' + df[time_col].astype(str),
-        errors='coerce'
-    )
-    
+    # Step 1: Remove inconsistencies in the time column (done once per distinct value)
+    def prepare(values):
+        values = values.astype(str).str.strip().str.replace('.', ':', regex=False)
+        return values.where(values.str.match(TIME_PATTERN))
+
+    # Step 2: Convert to proper time format; anything outside TIME_FORMATS becomes NaT
+    codes, times = parse_unique(df[time_col], TIME_FORMATS, fallback_format=None, prepare=prepare)
+    time_of_day = times - times.dt.normalize()
+    df[time_col] = pd.Series(take_by_code(times.dt.time, codes, pd.NaT), index=df.index)
+
+    # Step 3: Create combined timestamp column from date plus time of day
+    dates = pd.to_datetime(df[date_col], errors='coerce').dt.normalize()
+    df[timestamp_col] = dates + take_by_code(time_of_day, codes, np.timedelta64('NaT'))
+
     return df
 
 # ------------------ Agency, SubAgency--------------------------------#
@@ -97,59 +214,78 @@ def clean_location(df, location_col='Location'):
     return df
 
 
-# ------------------- Latitude, Longitude, Geolocation-----------------#
-
-def clean_lat_long_geo(df, lat_col='Latitude', long_col='Longitude', geo_col='Geolocation'):
+# ------------------- Latitude, Longitude-----------------#
+# Geolocation is not built here: see maps.skipped_columns
+def clean_lat_long(df, lat_col='Latitude', long_col='Longitude'):
     df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce').replace(0.0,np.nan).round(6)
     df[lat_col] = df[lat_col].where((df[lat_col] >= 18.9) & (df[lat_col] <= 71.5), np.nan)
 
     df[long_col] = pd.to_numeric(df[long_col], errors='coerce').replace(0.0, np.nan).round(6)
     df[long_col] = df[long_col].where((df[long_col] >= -179.9) & (df[long_col] <= -66.9),np.nan)
 
-    mask = df[lat_col].notna() & df[long_col].notna() 
-
-    df[geo_col] = None
-    df.loc[mask, geo_col] = pd.Series(list(zip(df.loc[mask, lat_col], df.loc[mask, long_col])),index=df.loc[mask].index)
-
-
     return df
 
 # ------------------ Boolean Columns ------------------#
 TRUE_SET = {'YES', 'Y', 'TRUE', 'T', '1', 1}
 FALSE_SET = {'NO', 'N', 'FALSE', 'F', '0', 0, '', np.nan}
 
-def clean_boolean_columns(df, columns):
-    for col in columns:
-        s = to_upper_strip(df[col])
-        df[col] = pd.NA  # default to missing
-        df.loc[s.isin(TRUE_SET), col] = True
-        df.loc[s.isin(FALSE_SET), col] = False
-    return df    
+def clean_boolean_columns(df, columns, flags_col='Flags', known_col='Flags Known'):
+    # Column i also sets bit i of flags_col (True) and known_col (not missing), in the same
+    # pass: both are taken by code from the few distinct values, like the booleans themselves
+    packed = np.zeros(len(df), dtype=np.int16)
+    known = np.zeros(len(df), dtype=np.int16)
+    for bit, col in enumerate(columns):
+        # A handful of distinct spellings per column: map those and take the nullable booleans by code
+        codes, uniques = factorize_column(df[col])
+        s = upper_strip(pd.Series(uniques, dtype=object))
+        flags = pd.Series(pd.NA, index=s.index, dtype='boolean')  # default to missing
+        flags[s.isin(TRUE_SET)] = True
+        flags[s.isin(FALSE_SET)] = False
+        df[col] = pd.Series(flags.array.take(codes), index=df.index)
+
+        mask = np.int16(1 << bit)
+        packed |= np.where(flags.fillna(False).to_numpy(dtype=bool), mask, 0).astype(np.int16)[codes]
+        known |= np.where(flags.notna().to_numpy(), mask, 0).astype(np.int16)[codes]
+    df[flags_col] = packed
+    df[known_col] = known
+    return df
 
 # -------------------Search Disposition, Search Outcome------------#
+def normalize_search(values, col):
+    s = upper_strip(values)
+    s = s.replace(['NAN','NOTHING'], 'NA')
+    if col == 'Search Reason For Stop':
+        s = s.str.rstrip("-")
+    if col == 'Search Arrest Reason':
+        s = s.replace({'MARIHUANA':'MARIJUANA','DRIVING':'TRAFFIC'})
+    return s
+
+
 def clean_search_columns(df,search_columns):
     for col in search_columns:
-        df[col] = to_upper_strip(df[col])
-        df[col] = df[col].replace(['NAN','NOTHING'], 'NA')
-        if col == 'Search Reason For Stop':
-            df[col] = df[col].str.rstrip("-")
-        if col == 'Search Arrest Reason':
-            df[col] = df[col].replace({'MARIHUANA':'MARIJUANA','DRIVING':'TRAFFIC'})
+        df[col] = normalize_unique(df[col], lambda s: normalize_search(s, col), ('search', col))
     return df
 
 # --------------------State---------------------------------#
 def clean_state(df, valid_codes, state_columns):
+    def valid_state(values):
+        s = upper_strip(values)
+        return s.where(s.isin(valid_codes), np.nan)
+
     for col in state_columns:
-        df[col] = to_upper_strip(df[col])
-        df[col] = np.where(df[col].isin(valid_codes),df[col],np.nan)
+        df[col] = normalize_unique(df[col], valid_state, ('state', tuple(valid_codes)))
 
     return df
 
 #-----------------Vehicle Type, Vehicle Code, Vehicle Category--------#
 
 def clean_vehicle_columns(df, type_col='VehicleType', code_col='Vehicle Code', category_col='Vehicle Category'):
-    s = to_upper_strip(df[type_col])
-    df[[code_col, category_col]] = s.str.split(' - ', expand=True)
+    # reindex keeps both parts when no value (e.g. in a row shard) contains ' - '
+    def part(i):
+        return lambda values: upper_strip(values).str.split(' - ', expand=True).reindex(columns=[0, 1])[i]
+
+    df[code_col] = normalize_unique(df[type_col], part(0), 'vehicle_code')
+    df[category_col] = normalize_unique(df[type_col], part(1), 'vehicle_category')
     return df
 
 # ------------------ Year ------------------
@@ -165,25 +301,39 @@ def clean_year(df, column='Year', min_val=None, max_val=None):
 
 
 # ------------------ Make ------------------
-def clean_make(df, make_map, column='Make'):
-    s = to_upper_strip(df[column])
-    s = s.str.replace(r'[^A-Z]', '', regex=True)
-    s = s.replace(make_map)
+def normalize_make(column, make_map):
+    def normalize(values):
+        s = upper_strip(values)
+        s = s.str.replace(r'[^A-Z]', '', regex=True)
+        return s.replace(make_map)
+
+    return normalize_unique(column, normalize, ('make', frozenset(make_map.items())))
 
-    make_counts = s.value_counts()
-    popular_makes = make_counts[make_counts > 200].index
+
+def clean_make(df, make_map, column='Make', min_count=200, popular_makes=None, vocabulary=None):
+    # popular_makes can be passed in when the counts come from the whole dataset (streaming mode);
+    # vocabulary (see vocabulary.py) corrects typos make_map does not know before the threshold
+    s = normalize_make(df[column], make_map)
+    if vocabulary is not None:
+        s = vocabulary.resolve(s)
+
+    if popular_makes is None:
+        make_counts = s.value_counts()
+        popular_makes = make_counts[make_counts > min_count].index
 
     df[column] = np.where(s.isin(popular_makes), s, 'OTHER')
     return df
 
 
 # ------------------ Model----------------------#
-def clean_model(df, column='Model'):
+def clean_model(df, column='Model', vocabulary=None):
     s = to_upper_strip(df[column])
     s = s.str.replace(r'[^A-Z0-9 ]', '', regex=True)
     s = s.str.lstrip('0')
     s = s.replace({'': np.nan, 'NONE': np.nan})
-    df[column] = s.replace({'': np.nan, 'NONE': np.nan})
+    if vocabulary is not None:
+        s = vocabulary.resolve(s)
+    df[column] = s
 
     model_counts = s.value_counts()
     popular_models = model_counts[model_counts > 50].index
@@ -191,17 +341,32 @@ def clean_model(df, column='Model'):
     return df
 
 # ------------------ Color ------------------------#
-def clean_color(df, color_map, column ='Color'):
-    df[column]= df[column].replace(color_map)
+def normalize_color(column, color_map):
+    return normalize_unique(column, lambda s: s.replace(color_map), ('color', frozenset(color_map.items())))
+
+
+def clean_color(df, color_map, column ='Color', vocabulary=None):
+    s = normalize_color(df[column], color_map)
+    df[column] = vocabulary.resolve(s) if vocabulary is not None else s
     return df
 
 # -----------------Driver City-----------------------#
-def clean_driver_city(df, city_col= 'Driver City', min_count = 50):
-    s = to_upper_strip(df[city_col])
-    s = s.str.replace(r'[^A-Z]','',regex=True)
-    s = s.str.replace(r'^[X]+','',regex=True).replace('',np.nan)
-    city_counts = s.value_counts()
-    popular_cities = city_counts[city_counts > min_count].index
+def normalize_driver_city(column):
+    def normalize(values):
+        s = upper_strip(values)
+        s = s.str.replace(r'[^A-Z]','',regex=True)
+        return s.str.replace(r'^[X]+','',regex=True).replace('',np.nan)
+
+    return normalize_unique(column, normalize, 'driver_city')
+
+
+def clean_driver_city(df, city_col= 'Driver City', min_count = 50, popular_cities=None, vocabulary=None):
+    s = normalize_driver_city(df[city_col])
+    if vocabulary is not None:
+        s = vocabulary.resolve(s)
+    if popular_cities is None:
+        city_counts = s.value_counts()
+        popular_cities = city_counts[city_counts > min_count].index
     df[city_col]= np.where(s.isin(popular_cities), s, np.nan)
     
     return df
@@ -209,13 +374,18 @@ def clean_driver_city(df, city_col= 'Driver City', min_count = 50):
 
 # ------------------ Violation Type, Arrest Type, Article---------
 
+def normalize_other(values, col):
+    s = upper_strip(values)
+    if col == 'Article':
+        s = s.replace('00',np.nan)
+    if col == 'Gender':
+        s = s.replace('U','UNKNOWN')
+    return s
+
+
 def clean_other_columns(df, other_columns):
     for col in other_columns:
-        df[col] = to_upper_strip(df[col])
-        if col == 'Article':
-            df[col] = df[col].replace('00',np.nan)
-        if col == 'Gender':
-            df[col] = df[col].replace('U','UNKNOWN')        
+        df[col] = normalize_unique(df[col], lambda s: normalize_other(s, col), ('other', col))
     return df
 
 
@@ -0,0 +1,121 @@
+import time
+
+from sqlalchemy import text
+
+from load_batches import completed_batches, publish_batches
+from maps import flag_bits
+
+# Bits of the packed flags / flags_known columns by table column name
+FLAG_BITS = {col.lower().replace(" ", "_"): bit for col, bit in flag_bits.items()}
+
+
+def flag_is_set(name, column="flags"):
+    # Bitwise test on the packed column; one SMALLINT read instead of a BOOLEAN column per flag
+    return f"({column} & {FLAG_BITS[name]}) <> 0"
+
+
+# Materialized views behind the dashboard. Each one is refreshed after every load,
+# so the dashboard never has to scan traffic_violations itself.
+ROLLUPS = {
+    # Counts by day and by every dimension the dashboard filters or ranks on
+    "violations_daily_rollup": (
+        f"""
+        SELECT date_of_stop, violation_type, gender, race, vehicle_category,
+               location, make, COUNT(*) AS violation_count,
+               COUNT(*) FILTER (WHERE {flag_is_set("accident")}) AS accident_count
+        FROM traffic_violations
+        GROUP BY date_of_stop, violation_type, gender, race, vehicle_category,
+                 location, make
+        """,
+        ["date_of_stop", "violation_type", "gender", "race", "vehicle_category",
+         "location", "make"],
+    ),
+    "violations_model_rollup": (
+        """
+        SELECT model, COUNT(*) AS violation_count
+        FROM traffic_violations
+        GROUP BY model
+        """,
+        ["model"],
+    ),
+    # Hour of day x weekday x month cube; every marginal of the time analytics in
+    # traffic_violations.sql is a GROUP BY over this small table
+    "violations_time_rollup": (
+        """
+        SELECT EXTRACT(HOUR FROM "timestamp")::int AS hour_of_day,
+               EXTRACT(DOW FROM date_of_stop)::int AS weekday_num,
+               EXTRACT(MONTH FROM date_of_stop)::int AS month_num,
+               COUNT(*) AS violation_count
+        FROM traffic_violations
+        GROUP BY hour_of_day, weekday_num, month_num
+        """,
+        ["hour_of_day", "weekday_num", "month_num"],
+    ),
+    # Latitude/longitude range per day, so the dashboard's coordinate sliders never scan
+    # traffic_violations (a single-row view could not be refreshed concurrently)
+    "violations_extent_rollup": (
+        """
+        SELECT date_of_stop,
+               MIN(latitude) AS lat_min, MAX(latitude) AS lat_max,
+               MIN(longitude) AS lon_min, MAX(longitude) AS lon_max
+        FROM traffic_violations
+        GROUP BY date_of_stop
+        """,
+        ["date_of_stop"],
+    ),
+}
+
+# Plain views over the packed flags
+VIEWS = {
+    # The boolean columns decoded from flags/flags_known (NULL when the bit is unknown)
+    "traffic_violation_flags": "SELECT seqid, date_of_stop, flags, flags_known, " + ", ".join(
+        f"CASE WHEN {flag_is_set(name, 'flags_known')} THEN {flag_is_set(name)} END AS {name}"
+        for name in FLAG_BITS
+    ) + " FROM traffic_violations",
+    # How many violations have each flag set, in one scan of the flags column
+    "violation_flag_counts": "SELECT COUNT(*) AS total_violations, " + ", ".join(
+        f"COUNT(*) FILTER (WHERE {flag_is_set(name)}) AS {name}_count" for name in FLAG_BITS
+    ) + " FROM traffic_violations",
+}
+
+
+def rollup_outdated(conn, name, query):
+    # A view created by an older version of its query (other columns) is rebuilt
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+        return False
+    current = list(conn.execute(text(f"SELECT * FROM {name} LIMIT 0")).keys())
+    wanted = list(conn.execute(text(f"SELECT * FROM ({query}) q LIMIT 0")).keys())
+    return current != wanted
+
+
+def create_rollups(conn):
+    for name, query in VIEWS.items():
+        conn.execute(text(f"CREATE OR REPLACE VIEW {name} AS {query}"))
+    for name, (query, keys) in ROLLUPS.items():
+        if rollup_outdated(conn, name, query):
+            conn.execute(text(f"DROP MATERIALIZED VIEW {name}"))
+        conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {query}"))
+        # the unique index lets REFRESH ... CONCURRENTLY run without blocking dashboard reads
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({', '.join(keys)})"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS violations_daily_rollup_date "
+                      "ON violations_daily_rollup (date_of_stop)"))
+
+
+def refresh_rollups(engine):
+    start = time.perf_counter()
+    try:
+        # CREATE OR REPLACE VIEW locks its view against reads until commit, so the
+        # definitions are committed before the refresh instead of held through it
+        with engine.begin() as conn:
+            create_rollups(conn)
+        with engine.begin() as conn:
+            # only batches committed before the refresh are in the refreshed rollups
+            batches = completed_batches(conn)
+            for name in ROLLUPS:
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+            # the dashboard picks up these batches once the rollups include them
+            published = publish_batches(conn, batches)
+        print(f"Rollups refreshed in {time.perf_counter() - start:.1f}s ({published} load batches published)")
+    except Exception as e:
+        print(f"Rollup refresh failed: {e}")
+        raise
@@ -0,0 +1,162 @@
+import gc
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import pandas as pd
+
+# Row-local steps are only split into shards when every shard gets at least this many rows
+MIN_SHARD_ROWS = 50_000
+
+
+# ------------------ Step declarations ------------------
+@dataclass
+class Step:
+    name: str
+    func: object
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    row_local: bool = True  # False when a row's result depends on other rows (value_counts thresholds)
+
+    def touches(self):
+        return set(self.inputs) | set(self.outputs)
+
+
+def build_waves(steps):
+    """Group steps into waves; every step in a wave only depends on earlier waves.
+
+    Step j depends on an earlier step i when i writes a column j reads or writes,
+    or j writes a column i reads, so running a wave concurrently never changes
+    what a step sees compared to the serial order.
+    """
+    levels = []
+    for j, step in enumerate(steps):
+        level = 0
+        for i in range(j):
+            earlier = steps[i]
+            if set(earlier.outputs) & step.touches() or set(earlier.inputs) & set(step.outputs):
+                level = max(level, levels[i] + 1)
+        levels.append(level)
+
+    waves = [[] for _ in range(max(levels, default=-1) + 1)]
+    for step, level in zip(steps, levels):
+        waves[level].append(step)
+    return waves
+
+
+# ------------------ Shared memory transfer ------------------
+# Frames are pickled with protocol 5 so numeric, categorical code and Arrow buffers
+# go out-of-band straight into one shared memory block instead of through the pipe.
+
+def to_shared(df):
+    buffers = []
+    header = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    sizes = [len(header)] + [raw.nbytes for raw in raws]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+    offset = 0
+    for chunk, size in zip([header] + raws, sizes):
+        shm.buf[offset:offset + size] = chunk
+        offset += size
+    name = shm.name
+    shm.close()
+    return name, sizes
+
+
+def from_shared(ref, unlink=False):
+    name, sizes = ref
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # bytearray copies, so nothing keeps the block mapped once it is closed
+        chunks, offset = [], 0
+        for size in sizes:
+            chunks.append(bytearray(shm.buf[offset:offset + size]))
+            offset += size
+        return pickle.loads(chunks[0], buffers=chunks[1:])
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def release_shared(ref):
+    try:
+        shm = shared_memory.SharedMemory(name=ref[0])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def run_task(func, ref, outputs):
+    # Runs in a worker process: rebuild the column subset, run the step, ship its outputs back
+    df = from_shared(ref)
+    result = func(df)[outputs]
+    out_ref = to_shared(result)
+    del df, result
+    gc.collect()
+    return out_ref
+
+
+# ------------------ Parallel executor ------------------
+def shard_bounds(n_rows, workers):
+    n_shards = max(1, min(workers, n_rows // MIN_SHARD_ROWS))
+    edges = [n_rows * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def run_wave(pool, data, wave, workers):
+    tasks = []
+    for step in wave:
+        columns = [col for col in data.columns if col in step.touches()]
+        bounds = shard_bounds(len(data), workers) if step.row_local else [(0, len(data))]
+        for start, stop in bounds:
+            ref = to_shared(data.iloc[start:stop][columns])
+            tasks.append((step, ref, pool.submit(run_task, step.func, ref, step.outputs)))
+
+    results = {}
+    try:
+        for step, ref, future in tasks:
+            results.setdefault(step.name, []).append(from_shared(future.result(), unlink=True))
+    finally:
+        for _, ref, _ in tasks:
+            release_shared(ref)
+
+    for step in wave:
+        pieces = results[step.name]
+        outputs = pieces[0] if len(pieces) == 1 else pd.concat(pieces)
+        for col in step.outputs:
+            data[col] = outputs[col]
+    return data
+
+
+def run_measured(name, func, data, columns=()):
+    return func(data)
+
+
+def run_parallel(data, steps, workers, after_wave=None, log=print, measure=run_measured):
+    """Run steps on a process pool and return the same frame the serial loop would.
+
+    Steps of one wave run concurrently, and row-local steps are additionally split
+    into row shards. Only the columns a step declares travel to the worker.
+    measure(name, func, data, columns) runs each wave, e.g. RunReport.run to time it.
+    """
+    final_columns = list(data.columns)
+    for step in steps:
+        final_columns += [col for col in step.outputs if col not in final_columns]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for number, wave in enumerate(build_waves(steps), start=1):
+            name = f"Wave {number}: " + ", ".join(step.name for step in wave)
+            log(name)
+
+            def wave_func(df, wave=wave):
+                df = run_wave(pool, df, wave, workers)
+                return after_wave(df) if after_wave is not None else df
+
+            outputs = [col for step in wave for col in step.outputs]
+            data = measure(name, wave_func, data, outputs)
+
+    return data[final_columns]
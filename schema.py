@@ -0,0 +1,217 @@
+import argparse
+import time
+
+from sqlalchemy import text
+
+from load_batches import create_batch_columns
+from rollups import FLAG_BITS, create_rollups, flag_is_set
+
+TABLE = "traffic_violations"
+
+# Indexes for the analytic queries in traffic_violations.sql and the dashboard filters.
+# BRIN stays tiny on the date columns because rows arrive roughly in date order;
+# the outcome flags only get partial indexes on the rare rows with their bit set, on the
+# same flag_is_set expression the queries and rollups filter on.
+INDEXES = {
+    "traffic_violations_date_brin": "USING brin (date_of_stop)",
+    "traffic_violations_timestamp_brin": 'USING brin ("timestamp")',
+    "traffic_violations_hour": '((EXTRACT(HOUR FROM "timestamp")))',
+    "traffic_violations_violation_type": "(violation_type)",
+    "traffic_violations_location": "(location)",
+    "traffic_violations_demographics": "(race, gender, violation_type)",
+    "traffic_violations_vehicle_category": "(vehicle_category, vehicletype)",
+    "traffic_violations_make": "(make)",
+    # bounding boxes (geolocation <@ box) are answered by the GiST index on the point
+    "traffic_violations_geolocation": "USING gist (geolocation)",
+    "traffic_violations_accident_flag": f"(date_of_stop) WHERE {flag_is_set('accident')}",
+    "traffic_violations_injury_flag": f"(date_of_stop) WHERE {flag_is_set('personal_injury')}",
+    "traffic_violations_property_damage_flag": f"(date_of_stop) WHERE {flag_is_set('property_damage')}",
+    "traffic_violations_fatal_flag": f"(date_of_stop) WHERE {flag_is_set('fatal')}",
+}
+
+OUTCOME_FLAGS = ["accident", "personal_injury", "property_damage", "fatal"]
+
+# Extended statistics on correlated columns, so the planner does not multiply
+# the selectivities of e.g. race and gender as if they were independent
+STATISTICS = {
+    "traffic_violations_demographics_stats": "(dependencies, ndistinct) ON race, gender, violation_type",
+    "traffic_violations_vehicle_stats": "(dependencies, ndistinct) ON vehicletype, vehicle_category, make",
+    # expression statistics (PostgreSQL 14+) on the flag bits: flag_is_set tests are estimated
+    # from each bit's frequency instead of the default selectivity of an unknown expression
+    "traffic_violations_outcome_flag_stats": "(dependencies) ON " + ", ".join(
+        f"(flags & {FLAG_BITS[name]})" for name in OUTCOME_FLAGS),
+    "traffic_violations_place_stats": "(dependencies, ndistinct) ON subagency, location",
+}
+
+# Earlier versions indexed the boolean columns, which no query filters on since flags exist
+LEGACY_INDEXES = ["traffic_violations_accident", "traffic_violations_injury",
+                  "traffic_violations_property_damage", "traffic_violations_fatal"]
+LEGACY_STATISTICS = ["traffic_violations_outcome_stats"]
+
+# baseline: primary key only, indexed: INDEXES + STATISTICS, partitioned: the same on yearly partitions
+VARIANTS = ["baseline", "indexed", "partitioned"]
+
+
+# ------------------ Indexes and statistics ------------------
+def drop_legacy(conn):
+    for name in LEGACY_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for name in LEGACY_STATISTICS:
+        conn.execute(text(f"DROP STATISTICS IF EXISTS {name}"))
+
+
+def create_indexes(conn, table=TABLE):
+    drop_legacy(conn)
+    for name, definition in INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def create_statistics(conn, table=TABLE):
+    for name, definition in STATISTICS.items():
+        conn.execute(text(f"CREATE STATISTICS IF NOT EXISTS {name} {definition} FROM {table}"))
+
+
+def drop_indexes(conn):
+    drop_legacy(conn)
+    for name in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for name in STATISTICS:
+        conn.execute(text(f"DROP STATISTICS IF EXISTS {name}"))
+
+
+def is_partitioned(conn, table=TABLE):
+    return conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = :table AND pg_table_is_visible(c.oid)
+        )
+        """), {"table": table}).scalar()
+
+
+# ------------------ Packed flags ------------------
+def pack_flags(conn, table=TABLE):
+    """Add the flags/flags_known SMALLINT columns to a table created before they existed
+    and fill them from the boolean columns for rows loaded without them."""
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS flags SMALLINT, "
+                      f"ADD COLUMN IF NOT EXISTS flags_known SMALLINT"))
+    packed = " | ".join(f"CASE WHEN {name} THEN {bit} ELSE 0 END" for name, bit in FLAG_BITS.items())
+    known = " | ".join(f"CASE WHEN {name} IS NOT NULL THEN {bit} ELSE 0 END" for name, bit in FLAG_BITS.items())
+    result = conn.execute(text(f"""
+        UPDATE {table} SET flags = ({packed})::smallint, flags_known = ({known})::smallint
+        WHERE flags IS NULL OR flags_known IS NULL
+        """))
+    if result.rowcount:
+        print(f"Packed flags filled in for {result.rowcount} rows")
+
+
+# ------------------ Geolocation point ------------------
+GEOLOCATION_SQL = "POINT GENERATED ALWAYS AS (point(longitude, latitude)) STORED"
+
+
+def geolocation_point(conn, table=TABLE):
+    """Replace the old geolocation TEXT column ("(lat, lon)") with a POINT (x = longitude,
+    y = latitude) that PostgreSQL computes from the coordinates on every insert."""
+    data_type = conn.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = :table AND column_name = 'geolocation' AND table_schema = current_schema()
+        """), {"table": table}).scalar()
+    if data_type == "point":
+        return
+    if data_type is not None:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN geolocation"))
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN geolocation {GEOLOCATION_SQL}"))
+    print(f"{table}.geolocation is now a generated POINT column")
+
+
+def stored_columns(conn, table=TABLE):
+    # Every column except generated ones, which cannot be inserted into
+    return [row[0] for row in conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = :table AND table_schema = current_schema() AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+        """), {"table": table})]
+
+
+# ------------------ Partitioning ------------------
+def partition_by_year(conn, table=TABLE):
+    """Rebuild table as a range-partitioned table with one partition per Date Of Stop year.
+
+    Rows without a date go to the default partition. A partitioned table can only
+    enforce uniqueness together with the partition key, so seqid becomes unique on
+    (seqid, date_of_stop): --upsert (ON CONFLICT (seqid)) needs the plain table.
+    The rollup views depend on the table and are recreated afterwards.
+    """
+    if is_partitioned(conn, table):
+        print(f"{table} is already partitioned")
+        return
+
+    years = conn.execute(text(f"""
+        SELECT EXTRACT(YEAR FROM MIN(date_of_stop))::int, EXTRACT(YEAR FROM MAX(date_of_stop))::int
+        FROM {table}
+        """)).fetchone()
+
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+    conn.execute(text(f"ALTER TABLE {table}_unpartitioned DROP CONSTRAINT IF EXISTS {table}_pkey"))
+    conn.execute(text(f"""
+        CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED)
+        PARTITION BY RANGE (date_of_stop)
+        """))
+    conn.execute(text(f"CREATE UNIQUE INDEX {table}_seqid_key ON {table} (seqid, date_of_stop)"))
+
+    if years[0] is not None:
+        for year in range(years[0], years[1] + 1):
+            conn.execute(text(f"""
+                CREATE TABLE {table}_y{year} PARTITION OF {table}
+                FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')
+                """))
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    columns = ", ".join(f'"{c}"' for c in stored_columns(conn, f"{table}_unpartitioned"))
+    conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_unpartitioned"))
+    conn.execute(text(f"DROP TABLE {table}_unpartitioned CASCADE"))
+    create_rollups(conn)
+    print(f"{table} partitioned by year: {years[0]}-{years[1]} and a default partition")
+
+
+def apply_variant(conn, variant, table=TABLE):
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown schema variant: {variant}")
+    pack_flags(conn, table)
+    geolocation_point(conn, table)
+    create_batch_columns(conn, table)
+    if variant == "partitioned":
+        partition_by_year(conn, table)
+    if variant == "baseline":
+        drop_indexes(conn)
+    else:
+        create_indexes(conn, table)
+        create_statistics(conn, table)
+
+
+def analyze(engine, table=TABLE):
+    # VACUUM cannot run inside a transaction; it also sets the visibility map for index-only scans
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a schema variant (indexes, statistics, partitioning) to traffic_violations")
+    parser.add_argument("variant", choices=VARIANTS)
+    args = parser.parse_args(argv)
+
+    from main import engine
+
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            apply_variant(conn, args.variant)
+        analyze(engine)
+        print(f"Schema variant '{args.variant}' applied in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print(f"Applying schema variant failed: {e}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
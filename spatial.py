@@ -0,0 +1,149 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Square grid cells aligned to web map tiles: a tile at zoom z spans 360 / 2**z degrees
+# and is split into CELLS_PER_TILE cells per side, so one cell is 256 / 64 = 4 px on screen.
+CELLS_PER_TILE = 64
+MIN_ZOOM = 8
+MAX_ZOOM = 13
+DEFAULT_ZOOM = 10
+
+# A level is only sent to the browser when it has at most this many cells;
+# otherwise the next coarser level is used
+MAX_CELLS = 5000
+
+CELL_COLUMNS = ["x", "y", "count", "accidents"]
+
+
+def cell_size(zoom):
+    return 360.0 / (2 ** zoom * CELLS_PER_TILE)
+
+
+# ------------------ Binning ------------------
+def bin_points(latitude, longitude, accident=None, zoom=MAX_ZOOM):
+    """Count points per grid cell at zoom; vectorized counterpart of the SQL binning query.
+
+    Returns one row per occupied cell with integer cell indices x (longitude) and
+    y (latitude), the number of points and the number of accident points.
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    accident = np.zeros(len(latitude), dtype=bool) if accident is None else np.asarray(accident, dtype=bool)
+
+    valid = ~np.isnan(latitude) & ~np.isnan(longitude) & (latitude != 0) & (longitude != 0)
+    size = cell_size(zoom)
+    cells = pd.DataFrame({
+        "x": np.floor(longitude[valid] / size).astype(np.int64),
+        "y": np.floor(latitude[valid] / size).astype(np.int64),
+        "count": 1,
+        "accidents": accident[valid].astype(np.int64),
+    })
+    return aggregate_cells(cells)
+
+
+def aggregate_cells(cells):
+    return cells.groupby(["x", "y"], as_index=False, sort=False)[["count", "accidents"]].sum()
+
+
+def coarsen(cells, levels):
+    # Cell sizes halve with every zoom level, so a parent cell index is a floor division
+    factor = 2 ** levels
+    parents = cells.assign(x=cells["x"] // factor, y=cells["y"] // factor)
+    return aggregate_cells(parents)
+
+
+# ------------------ Tile pyramid ------------------
+@dataclass
+class TilePyramid:
+    """Binned counts at every zoom from MIN_ZOOM to MAX_ZOOM, built from the finest level."""
+    levels: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_cells(cls, cells, max_zoom=MAX_ZOOM, min_zoom=MIN_ZOOM):
+        pyramid = cls({max_zoom: cells[CELL_COLUMNS].reset_index(drop=True)})
+        for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+            pyramid.levels[zoom] = coarsen(pyramid.levels[zoom + 1], 1)
+        return pyramid
+
+    def level(self, zoom, weight="count", max_cells=MAX_CELLS):
+        """Cell centres with their weight at zoom, or at the finest coarser zoom within max_cells.
+
+        Returns (zoom actually used, DataFrame of latitude, longitude, weight).
+        """
+        zoom = min(max(zoom, min(self.levels)), max(self.levels))
+        while zoom > min(self.levels) and len(self.levels[zoom]) > max_cells:
+            zoom -= 1
+
+        cells = self.levels[zoom]
+        cells = cells[cells[weight] > 0]
+        size = cell_size(zoom)
+        return zoom, pd.DataFrame({
+            "latitude": (cells["y"].to_numpy() + 0.5) * size,
+            "longitude": (cells["x"].to_numpy() + 0.5) * size,
+            weight: cells[weight].to_numpy(),
+        })
+
+
+# ------------------ Grid index ------------------
+# Cells of the index; at zoom 10 a cell is ~0.0055 degrees, so a county-wide box spans ~100 grid rows
+INDEX_ZOOM = DEFAULT_ZOOM
+
+
+@dataclass
+class GridIndex:
+    """Points sorted by grid cell, row by row (y, then x), for bounding box queries.
+
+    The cells of one grid row inside a box form one contiguous key range, so a box
+    costs a binary search pair per grid row it spans plus the points it returns,
+    instead of a scan over every point.
+    """
+    keys: np.ndarray  # sorted cell key of every point
+    x0: int
+    y0: int
+    width: int
+    height: int
+    zoom: int = INDEX_ZOOM
+
+    @classmethod
+    def build(cls, latitude, longitude, zoom=INDEX_ZOOM):
+        """Index the (non-missing) points; returns (index, order), order sorting the points into index order."""
+        size = cell_size(zoom)
+        x = np.floor(np.asarray(longitude, dtype=float) / size).astype(np.int64)
+        y = np.floor(np.asarray(latitude, dtype=float) / size).astype(np.int64)
+        if len(x) == 0:
+            return cls(np.zeros(0, dtype=np.int64), 0, 0, 0, 0, zoom), np.zeros(0, dtype=np.int64)
+
+        x0, y0 = int(x.min()), int(y.min())
+        width, height = int(x.max()) - x0 + 1, int(y.max()) - y0 + 1
+        keys = (y - y0) * width + (x - x0)
+        order = np.argsort(keys, kind="stable")
+        return cls(keys[order], x0, y0, width, height, zoom), order
+
+    def ranges(self, latitude_range, longitude_range):
+        """(start, stop) positions of the points in the cells overlapping the box.
+
+        Points in the edge cells can lie just outside the box; callers filter those exactly.
+        """
+        size = cell_size(self.zoom)
+        x_lo = max(int(np.floor(longitude_range[0] / size)) - self.x0, 0)
+        x_hi = min(int(np.floor(longitude_range[1] / size)) - self.x0, self.width - 1)
+        y_lo = max(int(np.floor(latitude_range[0] / size)) - self.y0, 0)
+        y_hi = min(int(np.floor(latitude_range[1] / size)) - self.y0, self.height - 1)
+        if x_lo > x_hi or y_lo > y_hi:
+            return []
+
+        rows = np.arange(y_lo, y_hi + 1, dtype=np.int64) * self.width
+        starts = np.searchsorted(self.keys, rows + x_lo, side="left")
+        stops = np.searchsorted(self.keys, rows + x_hi, side="right")
+
+        ranges = []
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            if stop <= start:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)  # the box spans whole grid rows
+            else:
+                ranges.append((start, stop))
+        return ranges
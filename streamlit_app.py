@@ -1,7 +1,11 @@
+import argparse
+import time
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
+import dashboard_queries as queries
+import spatial
 
 # Page Config
 st.set_page_config(page_title="Traffic Violations Dashboard",layout="wide")
@@ -20,86 +24,112 @@ def get_engine():
     )
     return engine
 
-engine = get_engine()
-
-# Fetch Raw data for summary
-
-@st.cache_data
-def fetch_raw_data():
-    query = """
-        SELECT DISTINCT location,
-               make,
-               accident,
-               date_of_stop,
-               model,
-               violation_type,
-               gender,
-               race,
-               vehicle_category,
-               latitude,
-               longitude,
-               vehicletype
-        FROM traffic_violations
-        """
-    return pd.read_sql(query, engine)
-
-summary_df = fetch_raw_data()
+# Backend switch: streamlit run streamlit_app.py -- --backend parquet --parquet-path DIR
+# reads the dataset written by main.py --parquet instead of querying PostgreSQL;
+# dashboard processes on one host share its indexed copy through --cache-dir
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["postgres", "parquet"], default="postgres")
+    parser.add_argument("--parquet-path", default="traffic_violations_parquet")
+    parser.add_argument("--cache-dir", default=None)
+    return parser.parse_known_args()[0]
+
+@st.cache_resource
+def get_dataset(path, cache_dir):
+    import arrow_cache
+    import parquet_store
+    return parquet_store.open_dataset(path, cache_dir or arrow_cache.CACHE_DIR)
+
+args = parse_args()
+if args.backend == "parquet":
+    import parquet_store as backend
+    source = get_dataset(args.parquet_path, args.cache_dir)
+else:
+    backend = queries
+    source = get_engine()
+
+# Shared by all sessions: filtered query results keyed by the normalized filter state
+@st.cache_resource
+def get_result_cache():
+    return queries.ResultCache()
+
+result_cache = get_result_cache()
+
+# Unfiltered summary, option lists and slider bounds: small independent queries run
+# concurrently on the engine's connection pool (or on the Parquet dataset), then
+# extended with the rows of every newly published load batch (delta refresh)
+
+@st.cache_resource
+def get_startup_data(backend_name):
+    return queries.StartupData(backend, source)
+
+# Seconds spent on this rerun, shown in the sidebar's load timings
+timings = {}
+
+def timed(stage, func):
+    start = time.perf_counter()
+    result = func()
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+startup_data = get_startup_data(args.backend)
+summary, options, batch = timed("summary and options", startup_data.current)
+
+# Filtered data: built from the filter state (SQL or a Parquet dataset filter) and cached
+# under it; results of earlier load batches are never hit again and age out of the cache
+
+def cached(name, filters, compute):
+    return timed(name, lambda: result_cache.get_or_compute((args.backend, batch, name, filters), compute))
 
 # Summary Statistics
 st.header("Summary Statistics - Overall data")
 col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
 
-col1.metric("Total Violations", len(summary_df))
-col2.metric("Accident Related", summary_df["accident"].sum() if "accident" in summary_df.columns else 0)
-col3.metric("High-Risk Zone", summary_df["location"].value_counts().idxmax() if not summary_df.empty else "N/A")
-col4.metric("Top Vehicle Make", summary_df["make"].value_counts().idxmax() if "make" in summary_df.columns and not summary_df.empty else "N/A")
-col5.metric("Top Vehicle Model", summary_df["model"].value_counts().idxmax() if "model" in summary_df.columns and not summary_df.empty else "N/A")
+col1.metric("Total Violations", summary["total"])
+col2.metric("Accident Related", summary["accidents"])
+col3.metric("High-Risk Zone", summary["location"])
+col4.metric("Top Vehicle Make", summary["make"])
+col5.metric("Top Vehicle Model", summary["model"])
 
 # Filter options
 st.sidebar.header("Filter Options")
-filters_df = summary_df[["location","violation_type","gender","race","vehicle_category","latitude","longitude","date_of_stop","make","vehicletype"]].copy()
-
-# Changing datatypes to perform analysis
-for col in ["location", "violation_type", "gender", "race", "vehicle_category"]:
-    filters_df[col] = filters_df[col].astype(str).str.strip().str.title()
-
-filters_df["date_of_stop"] = pd.to_datetime(filters_df["date_of_stop"],errors="coerce")
-filters_df["latitude"] = pd.to_numeric(filters_df["latitude"], errors="coerce")
-filters_df["longitude"] = pd.to_numeric(filters_df["longitude"], errors="coerce")
-filters_df = filters_df.dropna(subset=["latitude", "longitude"])
-
 
 # Date filters
-start_date = st.sidebar.date_input("Start Date", value=filters_df["date_of_stop"].min())
+start_date = st.sidebar.date_input("Start Date", value=options["min_date"])
 end_date = st.sidebar.date_input("End Date")
 
-# Categorical filters
+# Categorical filters (values as stored, shown title-cased)
 location = st.sidebar.multiselect(
     "Location",
-    sorted(filters_df["location"].dropna().unique())
+    options["location"],
+    format_func=str.title
 )
 
 violation_type = st.sidebar.multiselect(
     "Violation Type",
-    sorted(filters_df["violation_type"].dropna().unique())
+    options["violation_type"],
+    format_func=str.title
 )
 
 gender = st.sidebar.multiselect(
     "Gender",
-    sorted(filters_df["gender"].dropna().unique())
+    options["gender"],
+    format_func=str.title
 )
 
 race = st.sidebar.multiselect(
     "Race",
-    sorted(filters_df["race"].dropna().unique())
+    options["race"],
+    format_func=str.title
 )
 
 vehicle_category = st.sidebar.multiselect(
     "Vehicle Category",
-    sorted(filters_df["vehicle_category"].dropna().unique())
+    options["vehicle_category"],
+    format_func=str.title
 )
 # Latitude range
-lat_min, lat_max = float(filters_df["latitude"].min()), float(filters_df["latitude"].max())
+lat_min, lat_max = options["bounds"]["lat_min"], options["bounds"]["lat_max"]
 latitude_range = st.sidebar.slider(
     "Latitude Range",
     min_value=lat_min,
@@ -108,7 +138,7 @@ latitude_range = st.sidebar.slider(
 )
 
 # Longitude range
-lon_min, lon_max = float(filters_df["longitude"].min()), float(filters_df["longitude"].max())
+lon_min, lon_max = options["bounds"]["lon_min"], options["bounds"]["lon_max"]
 longitude_range = st.sidebar.slider(
     "Longitude Range",
     min_value=lon_min,
@@ -116,110 +146,114 @@ longitude_range = st.sidebar.slider(
     value=(lon_min, lon_max)
 )
 
-filtered_df = filters_df.copy()
-
-if start_date and end_date:
-    filtered_df = filtered_df[
-        (filtered_df["date_of_stop"] >= pd.to_datetime(start_date)) &
-        (filtered_df["date_of_stop"] <= pd.to_datetime(end_date))
-    ]
-
-if location:
-    filtered_df = filtered_df[filtered_df["location"].isin(location)]
-
-if violation_type:
-    filtered_df = filtered_df[filtered_df["violation_type"].isin(violation_type)]
-
-if gender:
-    filtered_df = filtered_df[filtered_df["gender"].isin(gender)]
-
-if race:
-    filtered_df = filtered_df[filtered_df["race"].isin(race)]
-
-if vehicle_category:
-    filtered_df = filtered_df[filtered_df["vehicle_category"].isin(vehicle_category)]
-
-filtered_df = filtered_df[
-    (filtered_df["latitude"].between(*latitude_range)) &
-    (filtered_df["longitude"].between(*longitude_range))
-]
+filters = queries.normalize_filters(
+    start_date, end_date,
+    {"location": location, "violation_type": violation_type, "gender": gender,
+     "race": race, "vehicle_category": vehicle_category},
+    latitude_range, longitude_range,
+    (lat_min, lat_max), (lon_min, lon_max),
+)
 
-tab1, tab2, tab3 = st.tabs(["Trends & Charts", "Distributions & Top Violations", "Geographical Heatmap"])
+# Tabs rerun the script when switched, and only the open tab fetches its data
+tab1, tab2, tab3 = st.tabs(["Trends & Charts", "Distributions & Top Violations", "Geographical Heatmap"],
+                           key="tab", on_change="rerun")
 
 # Treands and Charts Tab
 with tab1:
-    st.subheader("Violations Trend Over Time")
-    if not filtered_df.empty:
-        trend_df = filtered_df.groupby(filtered_df["date_of_stop"].dt.to_period("M")).size().reset_index(name="count")
-        trend_df["date_of_stop"] = trend_df["date_of_stop"].astype(str)
-        fig_trend = px.line(trend_df, x="date_of_stop", y="count", markers=True, title="Monthly Violation Trend", labels={"date_of_stop": "Month", "count": "Number of Violations"})
-        fig_trend.update_layout(xaxis_tickangle=-45,template="plotly_white",height=500)
-        st.plotly_chart(fig_trend, use_container_width=True)
-    else:
-        st.info("No data available for selected filters.")
+    if tab1.open:
+        trend_df = cached("trend", filters, lambda: backend.fetch_trend(source, filters)).copy()
+        trend_df["date_of_stop"] = pd.to_datetime(trend_df["date_of_stop"]).dt.to_period("M").astype(str)
+
+        st.subheader("Violations Trend Over Time")
+        if not trend_df.empty:
+            fig_trend = px.line(trend_df, x="date_of_stop", y="count", markers=True, title="Monthly Violation Trend", labels={"date_of_stop": "Month", "count": "Number of Violations"})
+            fig_trend.update_layout(xaxis_tickangle=-45,template="plotly_white",height=500)
+            st.plotly_chart(fig_trend, use_container_width=True)
+        else:
+            st.info("No data available for selected filters.")
 
 with tab2:
-    st.subheader("Top Vehicle Categories & Vehicle Makes")
-    col1, col2 = st.columns(2)
-
-    if not filtered_df.empty:
-        with col1:
-            top_categories = filtered_df["vehicle_category"].value_counts().head(10)
-            fig_category = px.bar(
-                x=top_categories.values,
-                y=top_categories.index,
-                orientation="h",
-                title="Top Vehicle Categories",
-                labels={"x": "Number of Violations", "y": "Vehicle Category"}
-            )
-            st.plotly_chart(fig_category, use_container_width=True)
-
-        with col2:
-            top_makes = filtered_df["make"].value_counts().head(10)
-            fig_make = px.bar(
-                x=top_makes.index,
-                y=top_makes.values,
-                title="Most Frequently Cited Vehicle Makes",
-                labels={"x": "Vehicle Make", "y": "Number of Violations"}
+    if tab2.open:
+        top_categories = cached("top_categories", filters, lambda: backend.fetch_top(source, "vehicle_category", filters))
+        top_makes = cached("top_makes", filters, lambda: backend.fetch_top(source, "make", filters))
+        vehicle_types_df = cached("vehicle_types", filters, lambda: backend.fetch_vehicle_types(source, filters))
+
+        st.subheader("Top Vehicle Categories & Vehicle Makes")
+        col1, col2 = st.columns(2)
+
+        if not top_categories.empty or not top_makes.empty:
+            with col1:
+                fig_category = px.bar(
+                    x=top_categories.values,
+                    y=top_categories.index,
+                    orientation="h",
+                    title="Top Vehicle Categories",
+                    labels={"x": "Number of Violations", "y": "Vehicle Category"}
+                )
+                st.plotly_chart(fig_category, use_container_width=True)
+
+            with col2:
+                fig_make = px.bar(
+                    x=top_makes.index,
+                    y=top_makes.values,
+                    title="Most Frequently Cited Vehicle Makes",
+                    labels={"x": "Vehicle Make", "y": "Number of Violations"}
+                )
+                st.plotly_chart(fig_make, use_container_width=True)
+
+        st.subheader("Violation Distribution by Vehicle Type")
+        if not vehicle_types_df.empty:
+            fig_dist = px.histogram(
+                vehicle_types_df,
+                x="vehicletype",
+                y="count",
+                histfunc="sum",
+                color="accident",
+                barmode="group",
+                title="Violations by Vehicle Type",
+                labels={"vehicletype": "Vehicle Type", "count": "Number of Violations", "accident": "Accident"}
             )
-            st.plotly_chart(fig_make, use_container_width=True)
-
-    st.subheader("Violation Distribution by Vehicle Type")
-    if not filtered_df.empty and "vehicletype" in filtered_df.columns:
-        fig_dist = px.histogram(
-            filtered_df,
-            x="vehicletype",
-            color="accident" if "accident" in filtered_df.columns else None,
-            barmode="group",
-            title="Violations by Vehicle Type",
-            labels={"vehicletype": "Vehicle Type", "count": "Number of Violations", "accident": "Accident"}
-        )
-        st.plotly_chart(fig_dist, use_container_width=True)
+            st.plotly_chart(fig_dist, use_container_width=True)
 
 # Geographical Heatmap
 with tab3:
-    st.subheader("Geographical Heatmap of Violations")
-    
-    # Clean coordinates
-    map_df = filtered_df.dropna(subset=["latitude", "longitude"])
-    map_df = map_df[(map_df["latitude"] != 0.0) & (map_df["longitude"] != 0.0)]
-
-    # Optional sampling for performance
-    if len(map_df) > 5000:
-        map_df = map_df.sample(5000, random_state=42)
-    
-    if not map_df.empty:
-        fig_map = px.density_mapbox(
-            map_df,
-            lat="latitude",
-            lon="longitude",
-            z="accident" if "accident" in map_df.columns else None,
-            radius=10,
-            center=dict(lat=map_df["latitude"].mean(), lon=map_df["longitude"].mean()),
-            zoom=10,
-            mapbox_style="open-street-map",
-            title="Traffic Violations Heatmap"
-        )
-        st.plotly_chart(fig_map, use_container_width=True)
-    else:
-        st.info("No geographical data available for selected filters.")
+    if tab3.open:
+        heatmap = cached("heatmap", filters, lambda: backend.fetch_heatmap(source, filters))
+
+        st.subheader("Geographical Heatmap of Violations")
+
+        col1, col2 = st.columns([3, 1])
+        zoom = col1.slider("Detail (map zoom)", min_value=spatial.MIN_ZOOM, max_value=spatial.MAX_ZOOM,
+                           value=spatial.DEFAULT_ZOOM)
+        weight = col2.radio("Weight", ["count", "accidents"], format_func=str.title, horizontal=True)
+
+        # Every filtered row is binned into grid cells; the zoom picks a level of the cached pyramid
+        level, cells_df = heatmap.level(zoom, weight)
+
+        if not cells_df.empty:
+            fig_map = px.density_mapbox(
+                cells_df,
+                lat="latitude",
+                lon="longitude",
+                z=weight,
+                radius=10,
+                center=dict(lat=cells_df["latitude"].mean(), lon=cells_df["longitude"].mean()),
+                zoom=level,
+                mapbox_style="open-street-map",
+                title="Traffic Violations Heatmap"
+            )
+            st.plotly_chart(fig_map, use_container_width=True)
+            label = "violations" if weight == "count" else "accidents"
+            st.caption(f"{int(cells_df[weight].sum())} {label} in {len(cells_df)} cells of "
+                       f"{spatial.cell_size(level) * 111_000:.0f} m")
+        else:
+            st.info("No geographical data available for selected filters.")
+
+# Load timings: the startup queries ran concurrently (wall vs sum of each query),
+# filtered data is timed per rerun (near zero when served from the result cache)
+with st.sidebar.expander("Load timings"):
+    st.caption(f"Startup or last refresh: {startup_data.wall:.2f}s wall for "
+               f"{sum(startup_data.seconds.values()):.2f}s of queries (load batch {batch})")
+    st.dataframe(pd.Series(startup_data.seconds, name="seconds").sort_values(ascending=False).round(3))
+    st.caption("This run")
+    st.dataframe(pd.Series(timings, name="seconds").round(3))
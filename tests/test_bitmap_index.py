@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from bitmap_index import DENSE_VALUES, FilterIndex  # noqa: E402
+
+COLUMNS = ["gender", "location"]
+
+
+def frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Series(pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 60, n), unit="D"))
+    dates[rng.random(n) < 0.05] = pd.NaT
+    df = pd.DataFrame({
+        "date_of_stop": dates,
+        "gender": pd.Series(rng.choice(["F", "M", "U"], n)).where(rng.random(n) > 0.1),
+        # more values than DENSE_VALUES: posting lists instead of bitmaps
+        "location": pd.Series(rng.integers(0, DENSE_VALUES * 3, n)).map("LOC {}".format).where(rng.random(n) > 0.1),
+    })
+    # sorted by date as MemoryCopy keeps it, missing dates last
+    return df.sort_values("date_of_stop", na_position="last", kind="stable").reset_index(drop=True)
+
+
+def selected(index, df, date_range=None, selections=None, candidates=()):
+    rows, mask = index.select(date_range, selections, candidates)
+    positions = np.arange(len(df))[rows]
+    return positions if mask is None else positions[mask.to_numpy(zero_copy_only=False)]
+
+
+def expected(df, date_range=None, selections=None, candidates=()):
+    keep = pd.Series(True, index=df.index)
+    if date_range is not None:
+        keep &= df["date_of_stop"].between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))
+    for col, values in (selections or {}).items():
+        if values:
+            keep &= df[col].isin(values)
+    for positions in candidates:
+        keep &= df.index.isin(positions)
+    return np.flatnonzero(keep.to_numpy())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_select_matches_pandas_masks(seed):
+    df = frame(seed=seed)
+    index = FilterIndex.build(pa.Table.from_pandas(df, preserve_index=False), "date_of_stop", COLUMNS)
+    rng = np.random.default_rng(seed + 100)
+    locations = sorted(df["location"].dropna().unique())
+    for _ in range(50):
+        start = pd.Timestamp("2020-01-01") + pd.Timedelta(days=int(rng.integers(0, 60)))
+        date_range = (start.value, (start + pd.Timedelta(days=int(rng.integers(0, 20)))).value)
+        date_range = date_range if rng.random() < 0.7 else None
+        selections = {"gender": list(rng.choice(["F", "M", "U", "X"], rng.integers(0, 3), replace=False)),
+                      "location": list(rng.choice(locations, rng.integers(0, 5), replace=False))}
+        candidates = [np.sort(rng.choice(len(df), 300, replace=False))] if rng.random() < 0.5 else []
+        np.testing.assert_array_equal(selected(index, df, date_range, selections, candidates),
+                                      expected(df, date_range, selections, candidates))
+
+
+def test_index_read_back_from_its_arrays_selects_the_same_rows():
+    df = frame(seed=7)
+    index = FilterIndex.build(pa.Table.from_pandas(df, preserve_index=False), "date_of_stop", COLUMNS)
+    arrays, values = index.arrays()
+    restored = FilterIndex.from_arrays(arrays, values)
+    selections = {"gender": ["F"], "location": ["LOC 1", "LOC 150"]}
+    date_range = (pd.Timestamp("2020-01-10").value, pd.Timestamp("2020-02-10").value)
+    np.testing.assert_array_equal(selected(restored, df, date_range, selections),
+                                  expected(df, date_range, selections))
+
+
+def test_empty_date_range_selects_nothing():
+    df = frame(seed=3)
+    index = FilterIndex.build(pa.Table.from_pandas(df, preserve_index=False), "date_of_stop", COLUMNS)
+    date_range = (pd.Timestamp("2019-01-01").value, pd.Timestamp("2019-12-31").value)
+    assert len(selected(index, df, date_range, {"gender": ["F"]})) == 0
@@ -0,0 +1,109 @@
+import importlib.util
+import itertools
+import sys
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from checkpoints import CheckpointStore, StageRunner, code_fingerprint, value_fingerprint  # noqa: E402
+
+STAGES = ["load", "merge", "clean", "convert"]
+
+
+def run_stages(directory, fingerprints, from_step=None, until_step=None):
+    """Runs the chained STAGES with these fingerprints; the names of the stages computed,
+    in stage order (outputs are deferred, so the last stage computes the ones it needs)."""
+    runner = StageRunner(CheckpointStore(directory), "input", from_step, until_step)
+    computed = []
+    output = None
+    for name in STAGES:
+        def compute(name=name, previous=output):
+            computed.append(name)
+            return (previous.get() if previous is not None else ()) + (name,)
+        output = runner.run(name, compute, fingerprints[name])
+        if runner.stopped:
+            break
+    assert output.get() == tuple(STAGES[:STAGES.index(name) + 1])
+    return sorted(computed, key=STAGES.index)
+
+
+def reruns(changed):
+    # Plain rule: a stage reruns when it or any stage before it changed
+    return [name for i, name in enumerate(STAGES) if any(n in changed for n in STAGES[:i + 1])]
+
+
+@pytest.mark.parametrize("changed", [c for k in range(len(STAGES) + 1) for c in itertools.combinations(STAGES, k)])
+def test_a_changed_stage_reruns_with_every_stage_after_it(tmp_path, changed):
+    fingerprints = {name: f"{name} v1" for name in STAGES}
+    assert run_stages(tmp_path, fingerprints) == STAGES
+    fingerprints.update({name: f"{name} v2" for name in changed})
+    assert run_stages(tmp_path, fingerprints) == reruns(changed)
+    assert run_stages(tmp_path, fingerprints) == []
+    # one checkpoint per stage: the stale ones were evicted
+    assert len(list(tmp_path.iterdir())) == len(STAGES)
+
+
+def test_from_step_and_until_step(tmp_path):
+    fingerprints = {name: name for name in STAGES}
+    assert run_stages(tmp_path, fingerprints, until_step="merge") == ["load", "merge"]
+    assert run_stages(tmp_path, fingerprints) == ["clean", "convert"]
+    assert run_stages(tmp_path, fingerprints, from_step="clean") == ["clean", "convert"]
+
+
+def test_valid_checkpoints_before_the_first_stage_to_run_are_not_read(tmp_path):
+    fingerprints = {name: name for name in STAGES}
+    run_stages(tmp_path, fingerprints)
+    (tmp_path / next(p.name for p in tmp_path.iterdir() if p.name.startswith("load-"))).write_bytes(b"broken")
+    fingerprints["clean"] = "clean v2"
+    assert run_stages(tmp_path, fingerprints) == ["clean", "convert"]
+
+
+def test_side_stage_does_not_enter_the_chain(tmp_path):
+    def run(side_fingerprint):
+        runner = StageRunner(CheckpointStore(tmp_path), "input")
+        computed = []
+        runner.run("load", lambda: computed.append("load") or 1, "load").get()
+        runner.side("count", lambda: computed.append("count") or 2, side_fingerprint).get()
+        runner.run("clean", lambda: computed.append("clean") or 3, "clean").get()
+        return computed
+    assert run("v1") == ["load", "count", "clean"]
+    assert run("v2") == ["count"]
+
+
+def load_module(tmp_path, name, source):
+    path = tmp_path / f"{name}.py"
+    path.write_text(textwrap.dedent(source))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+RULES = """
+    LIMIT = 10
+    _cache = {}
+
+    def helper(x):
+        return min(x, LIMIT)
+
+    def step(df):
+        _cache[len(df)] = True
+        return helper(len(df))
+"""
+
+
+def test_code_fingerprint_follows_the_functions_and_constants_a_step_uses(tmp_path):
+    base = code_fingerprint(load_module(tmp_path, "rules_a", RULES).step)
+    module = load_module(tmp_path, "rules_b", RULES)
+    module.step(pd.DataFrame({"x": [1]}))  # module state (caches) is not part of the rule
+    assert code_fingerprint(module.step) == base
+    assert code_fingerprint(load_module(tmp_path, "rules_c", RULES.replace("LIMIT = 10", "LIMIT = 11")).step) != base
+    assert code_fingerprint(load_module(tmp_path, "rules_d", RULES.replace("min(x", "max(x")).step) != base
+
+
+def test_value_fingerprint_ignores_dict_and_set_order():
+    assert value_fingerprint({"a": 1, "b": {2, 3}}) == value_fingerprint({"b": {3, 2}, "a": 1})
+    assert value_fingerprint({"a": 1}) != value_fingerprint({"a": 2})
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from frequency import FrequencyCounter  # noqa: E402
+
+
+def stops(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 30, n), unit="D")
+    dates = pd.Series(days.strftime("%m/%d/%Y"), dtype=object)
+    dates[rng.random(n) < 0.05] = "not a date"
+    return pd.DataFrame({
+        "Date Of Stop": dates,
+        "make": pd.Series(rng.choice(["TOYOTA", "HONDA", "FORD", "KIA"], n, p=[0.4, 0.3, 0.2, 0.1])).where(
+            rng.random(n) > 0.05),
+        "driver_city": rng.choice(["SILVER SPRING", "ROCKVILLE", "OLNEY"], n),
+    })
+
+
+def count(df):
+    return FrequencyCounter.count({"make": df["make"], "driver_city": df["driver_city"]}, df["Date Of Stop"])
+
+
+def value_counts(df, name):
+    return df[name].value_counts().sort_index()
+
+
+def test_counters_of_shards_add_up_to_the_counts_of_the_whole_frame():
+    df = stops()
+    counter = FrequencyCounter()
+    shuffled = df.sample(frac=1, random_state=1)
+    for start in range(0, len(df), 300):
+        counter.add(count(shuffled.iloc[start:start + 300]))
+    for name in ["make", "driver_city"]:
+        pd.testing.assert_series_equal(counter.totals(name).sort_index(), value_counts(df, name),
+                                       check_names=False, check_index_type=False)
+
+
+def test_update_replaces_the_days_a_run_saw_instead_of_counting_them_twice():
+    df = stops(seed=1)
+    day = pd.to_datetime(df["Date Of Stop"], format="%m/%d/%Y", errors="coerce")
+    watermark = pd.Timestamp("2021-01-20")
+    # the incremental run re-reads the watermark day and everything after it
+    stored = count(df[(day <= watermark) | day.isna()])
+    stored.update(count(df[day >= watermark]))
+    pd.testing.assert_series_equal(stored.totals("make").sort_index(), value_counts(df, "make"),
+                                   check_names=False, check_index_type=False)
+
+
+def test_saved_counter_loads_with_the_same_totals(tmp_path):
+    counter = count(stops(seed=2))
+    counter.save(tmp_path / "counts.pkl")
+    loaded = FrequencyCounter.load(tmp_path / "counts.pkl")
+    assert loaded.days == counter.days
+    pd.testing.assert_series_equal(loaded.totals("make"), counter.totals("make"))
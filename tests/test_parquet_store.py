@@ -0,0 +1,115 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import parquet_store  # noqa: E402
+from dashboard_queries import Filters  # noqa: E402
+
+
+def test_write_read_round_trip_with_missing_coordinates(tmp_path):
+    df = pd.DataFrame({
+        "SeqID": ["a", "b", "c", "d"],
+        "Date Of Stop": pd.to_datetime(["2020-01-05", "2020-01-02", None, "2021-03-01"]),
+        "Latitude": [39.1, np.nan, 39.2, 39.3],
+        "Longitude": [-77.1, -77.2, np.nan, -77.3],
+    })
+    parquet_store.write_dataset(df.iloc[:2], tmp_path, basename="part-00000")
+    parquet_store.write_dataset(df.iloc[2:], tmp_path, basename="part-00001")
+    parquet_store.compact_dataset(tmp_path)
+
+    result = pd.read_parquet(tmp_path).sort_values("seqid").reset_index(drop=True)
+    assert result["seqid"].tolist() == ["a", "b", "c", "d"]
+    assert result["latitude"].tolist()[::2] == [39.1, 39.2]
+    assert result["geolocation"].tolist() == [
+        {"longitude": -77.1, "latitude": 39.1}, None, None, {"longitude": -77.3, "latitude": 39.3}]
+
+
+def test_dataset_is_swapped_in_only_when_finished(tmp_path):
+    df = pd.DataFrame({
+        "SeqID": ["a", "b"],
+        "Date Of Stop": pd.to_datetime(["2020-01-05", "2021-03-01"]),
+        "Latitude": [39.1, 39.3],
+        "Longitude": [-77.1, -77.3],
+    })
+    path = tmp_path / "dataset"
+    for rows in (df.iloc[:1], df):
+        staging = parquet_store.begin_dataset(path)
+        parquet_store.write_dataset(rows, staging)
+        if path.exists():
+            assert len(pd.read_parquet(path)) == 1  # the previous dataset until the swap
+        parquet_store.finish_dataset(staging, path)
+    assert sorted(pd.read_parquet(path)["seqid"]) == ["a", "b"]
+    assert [p.name for p in tmp_path.iterdir()] == ["dataset"]
+
+
+def test_refuses_to_overwrite_other_directories(tmp_path):
+    (tmp_path / "notes.txt").write_text("not a dataset")
+    with pytest.raises(SystemExit):
+        parquet_store.begin_dataset(tmp_path)
+    assert (tmp_path / "notes.txt").exists()
+
+
+def stops(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "SeqID": [f"s{seed}-{i}" for i in range(n)],
+        "Date Of Stop": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 700, n), unit="D"),
+        "Location": rng.choice(["MAIN ST", "GEORGIA AVE", "RANDOLPH RD"], n),
+        "Violation Type": rng.choice(["Citation", "Warning"], n),
+        "Gender": rng.choice(["F", "M"], n),
+        "Race": rng.choice(["WHITE", "BLACK", "ASIAN"], n),
+        "Vehicle Category": rng.choice(["Car", "Truck"], n),
+        "Make": rng.choice(["TOYOTA", "HONDA"], n),
+        "VehicleType": rng.choice(["02 - Automobile", "05 - Light Duty Truck"], n),
+        "Latitude": rng.uniform(39.0, 39.3, n),
+        "Longitude": rng.uniform(-77.3, -77.0, n),
+        "flags": rng.integers(0, 4, n).astype(np.int16),
+    })
+
+
+def publish(df, path):
+    staging = parquet_store.begin_dataset(path)
+    parquet_store.write_dataset(df, staging)
+    parquet_store.finish_dataset(staging, path)
+
+
+def test_indexed_dataset_swaps_to_a_new_version_only_once_built(tmp_path, monkeypatch):
+    path, cache_dir = tmp_path / "dataset", tmp_path / "cache"
+    publish(stops(50), path)
+    dataset = parquet_store.open_dataset(path, cache_dir)
+    assert len(parquet_store.read(dataset, ["location"], Filters())) == 50
+    first = dataset.version
+
+    # a new dataset whose copy cannot be built: the previous dataset and copy stay in use
+    publish(stops(80, seed=1), path)
+    def unreadable(cls, dataset):
+        raise OSError("part file removed")
+    monkeypatch.setattr(parquet_store.MemoryCopy, "build", classmethod(unreadable))
+    dataset.refresh(force=True)
+    assert dataset.version == first
+    assert len(parquet_store.read(dataset, ["location"], Filters())) == 50
+
+    monkeypatch.undo()
+    dataset.refresh(force=True)
+    assert dataset.version != first
+    assert len(parquet_store.read(dataset, ["location"], Filters())) == 80
+    assert len(dataset.to_table(columns=["seqid"])) == 80
+
+
+def test_plain_reads_follow_a_dataset_swapped_in_between_checks(tmp_path):
+    path = tmp_path / "dataset"
+    publish(stops(50), path)
+    dataset = parquet_store.open_dataset(path, tmp_path / "cache")
+    publish(stops(80, seed=1), path)  # the files of the first dataset are gone
+    assert len(dataset.to_table(columns=["seqid"])) == 80
+
+
+def test_incomplete_dataset_is_not_opened(tmp_path):
+    parquet_store.write_dataset(stops(10), tmp_path)  # no marker: never swapped in
+    with pytest.raises(FileNotFoundError):
+        parquet_store.open_dataset(tmp_path, tmp_path / "cache")
@@ -0,0 +1,106 @@
+import itertools
+import random
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import vocabulary  # noqa: E402
+from vocabulary import DOMINANCE, TermIndex, Vocabulary, deletes, edit_budget, edit_distance  # noqa: E402
+
+
+def osa_distance(a, b):
+    # Plain optimal string alignment table, no early exit
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def random_words(n, seed=0, alphabet="ABCD1"):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10))) for _ in range(n)]
+
+
+def test_edit_distance_matches_the_full_table_up_to_the_limit():
+    words = random_words(120)
+    for a, b in itertools.product(words[:40], words[40:]):
+        for limit in (0, 1, 2):
+            assert edit_distance(a, b, limit) == min(osa_distance(a, b), limit + 1), (a, b, limit)
+
+
+def test_deletes_are_every_subsequence_missing_up_to_distance_characters():
+    for word in ["", "KIA", "TOYOTA", "AABBA"]:
+        for distance in (0, 1, 2):
+            expected = {"".join(word[i] for i in range(len(word)) if i not in removed)
+                        for k in range(min(distance, len(word)) + 1)
+                        for removed in itertools.combinations(range(len(word)), k)}
+            assert deletes(word, distance) == expected
+
+
+def scan_lookup(weights, seeds, value, count):
+    # Every term checked against the same rules, without the deletion index
+    best = None
+    for term, weight in weights.items():
+        limit = min(edit_budget(value), edit_budget(term))
+        if term == value or vocabulary.digits(term) != vocabulary.digits(value):
+            continue
+        if term not in seeds and weight < DOMINANCE * max(count, 1):
+            continue
+        if limit == 0 or osa_distance(value, term) > limit:
+            continue
+        rank = (osa_distance(value, term), -weight, term)
+        best = rank if best is None or rank < best else best
+    return best[2] if best is not None else None
+
+
+def misspelled(rng, word, alphabet):
+    # up to three random substitutions, insertions, deletions or adjacent swaps
+    for _ in range(rng.randint(0, 3)):
+        i = rng.randrange(len(word) + 1)
+        edit = rng.choice(["substitute", "insert", "delete", "swap"])
+        if edit == "insert":
+            word = word[:i] + rng.choice(alphabet) + word[i:]
+        elif edit == "substitute" and i < len(word):
+            word = word[:i] + rng.choice(alphabet) + word[i + 1:]
+        elif edit == "delete" and i < len(word):
+            word = word[:i] + word[i + 1:]
+        elif edit == "swap" and i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def test_term_index_finds_what_a_scan_of_every_term_finds():
+    rng = random.Random(1)
+    terms = random_words(300, seed=2, alphabet="ABCDE12")
+    weights = {term: rng.choice([1, 5, 50, 500]) for term in terms}
+    seeds = set(rng.sample(sorted(weights), 10))
+    index = TermIndex(weights, seeds)
+    found = 0
+    for value in [misspelled(rng, rng.choice(terms), "ABCDE12") for _ in range(1000)]:
+        count = rng.choice([0, 1, 5, 40])
+        term = index.lookup(value, count)
+        assert term == scan_lookup(weights, seeds, value, count), value
+        found += term is not None
+    assert found > 25  # enough queries get past the budget and dominance rules
+
+
+def test_short_values_and_other_numbers_are_never_corrected():
+    index = TermIndex({"KIA": 1000, "CIVIC 2020": 1000}, seeds=())
+    assert index.lookup("KIT", 1) is None
+    assert index.lookup("CIVIC 2021", 1) is None
+    assert index.lookup("CIVIK 2020", 1) == "CIVIC 2020"
+
+
+def test_saved_corrections_are_rechecked_against_the_current_counts():
+    vocabulary = Vocabulary({"TOYOTAA": "TOYOTA", "HONDAA": "HONDA", "RIVIANN": "RIVIAN"})
+    counts = pd.Series({"TOYOTA": 5000, "TOYOTAA": 300, "HONDA": 50, "HONDAA": 20,
+                        "RIVIAN": 400, "RIVIANN": 300})
+    learned, dropped = vocabulary.learn(counts, min_count=200)
+    # TOYOTAA is popular but still outweighed ten to one; HONDA and RIVIAN no longer dominate
+    assert vocabulary.mappings == {"TOYOTAA": "TOYOTA"}
+    assert (learned, dropped) == (0, 2)
@@ -40,14 +40,52 @@ CREATE TABLE traffic_violations(
     driver_state CHAR(2),
     dl_state CHAR(2),
     arrest_type TEXT,
-    geolocation TEXT,
+    -- x = longitude, y = latitude; computed by PostgreSQL, never loaded (see maps.skipped_columns)
+    geolocation POINT GENERATED ALWAYS AS (point(longitude, latitude)) STORED,
     description TEXT,
     charge TEXT,
     "timestamp" TIMESTAMP,
     vehicle_code TEXT,
-    vehicle_category TEXT
+    vehicle_category TEXT,
+    -- the boolean columns packed into bits (maps.flag_bits: accident = 1, belts = 2,
+    -- personal_injury = 4, property_damage = 8, fatal = 16, ...); flags_known marks non-NULL ones.
+    -- Tables created before these columns: python schema.py <variant> adds and fills them
+    flags SMALLINT,
+    flags_known SMALLINT,
+    -- load_batches.batch_id of the load that inserted or last changed the row (NULL: loaded before batches)
+    load_batch BIGINT
 );
 
+-- One row per main.py load, completed in the transaction that writes its rows;
+-- refresh_rollups publishes the completed batches the rollups include (publication numbers
+-- them in publishing order), and the dashboard then fetches only the rows of newly published batches
+CREATE TABLE IF NOT EXISTS load_batches (
+    batch_id BIGSERIAL PRIMARY KEY,
+    rows BIGINT,
+    loaded_at TIMESTAMP DEFAULT now(),
+    completed_at TIMESTAMP,
+    published_at TIMESTAMP,
+    publication BIGINT
+);
+CREATE SEQUENCE IF NOT EXISTS load_batch_publications;
+CREATE INDEX IF NOT EXISTS traffic_violations_load_batch ON traffic_violations (load_batch);
+
+-- Incremental loads (main.py --upsert / --incremental): COPY goes into the unlogged
+-- staging table and is merged with INSERT ... ON CONFLICT (seqid) DO UPDATE
+CREATE UNLOGGED TABLE IF NOT EXISTS traffic_violations_staging
+    (LIKE traffic_violations INCLUDING DEFAULTS);
+
+-- Latest Date Of Stop loaded, the next incremental run starts from this date
+CREATE TABLE IF NOT EXISTS pipeline_watermarks (
+    name TEXT PRIMARY KEY,
+    value TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT now()
+);
+
+-- Indexes, extended statistics and optional yearly partitioning are managed by schema.py:
+--   python schema.py indexed | partitioned | baseline
+-- benchmarks/bench_schema.py times the queries below against each variant
+
 SELECT COUNT(*) FROM traffic_violations;
 
 SELECT * FROM traffic_violations LIMIT 2;
@@ -88,6 +126,8 @@ GROUP BY gender, violation_type
 ORDER BY gender, violation_count DESC;
 
 -- How does violation frequency vary by time of day, weekday, or month?
+-- (violations_time_rollup, refreshed by main.py via rollups.py, answers these from a small cube:
+--  SELECT hour_of_day, SUM(violation_count) FROM violations_time_rollup GROUP BY hour_of_day ORDER BY hour_of_day;)
 SELECT EXTRACT(HOUR FROM "timestamp") AS hour_of_day,
        COUNT(*) AS violation_count
 FROM traffic_violations
@@ -99,8 +139,8 @@ SELECT EXTRACT(DAY FROM date_of_stop) AS day_of_month,
        COUNT(*) AS violation_count
 FROM traffic_violations
 WHERE date_of_stop IS NOT NULL
-GROUP BY day_of_week
-ORDER BY day_of_week;
+GROUP BY day_of_month
+ORDER BY day_of_month;
  
 SELECT TO_CHAR(date_of_stop, 'Day') AS weekday,
        EXTRACT(DOW FROM date_of_stop) AS weekday_num,
@@ -133,19 +173,20 @@ FROM traffic_violations
 GROUP BY accident
 ORDER BY violation_count;
 
+-- Flag counts read the packed flags column only (the violation_flag_counts view has all of them)
 SELECT
     COUNT(*) AS total_violations,
-    COUNT(*) FILTER (WHERE accident = TRUE) AS accident_count,
-    COUNT(*) FILTER (WHERE personal_injury = TRUE) AS injury_count,
-    COUNT(*) FILTER (WHERE property_damage = TRUE) AS property_damage_count,
-    COUNT(*) FILTER (WHERE fatal = TRUE) AS fatal_count
+    COUNT(*) FILTER (WHERE flags & 1 <> 0) AS accident_count,
+    COUNT(*) FILTER (WHERE flags & 4 <> 0) AS injury_count,
+    COUNT(*) FILTER (WHERE flags & 8 <> 0) AS property_damage_count,
+    COUNT(*) FILTER (WHERE flags & 16 <> 0) AS fatal_count
 FROM traffic_violations;
 
 SELECT
-    ROUND(100.0 * COUNT(*) FILTER (WHERE accident = TRUE) / COUNT(*), 2) AS accident_pct,
-    ROUND(100.0 * COUNT(*) FILTER (WHERE personal_injury = TRUE) / COUNT(*), 2) AS injury_pct,
-    ROUND(100.0 * COUNT(*) FILTER (WHERE property_damage = TRUE) / COUNT(*), 2) AS property_damage_pct,
-    ROUND(100.0 * COUNT(*) FILTER (WHERE fatal = TRUE) / COUNT(*), 2) AS fatal_pct
+    ROUND(100.0 * COUNT(*) FILTER (WHERE flags & 1 <> 0) / COUNT(*), 2) AS accident_pct,
+    ROUND(100.0 * COUNT(*) FILTER (WHERE flags & 4 <> 0) / COUNT(*), 2) AS injury_pct,
+    ROUND(100.0 * COUNT(*) FILTER (WHERE flags & 8 <> 0) / COUNT(*), 2) AS property_damage_pct,
+    ROUND(100.0 * COUNT(*) FILTER (WHERE flags & 16 <> 0) / COUNT(*), 2) AS fatal_pct
 FROM traffic_violations;
 
 
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import preprocessing as pp
+
+# Edit budget by length: short values are never corrected (KIA/KIT, OLNEY/OLMEY are
+# both plausible), longer ones get one edit, long ones two.
+ONE_EDIT_LENGTH = 5
+TWO_EDIT_LENGTH = 9
+MAX_DISTANCE = 2
+
+# A value is only resolved to a term seen at least this many times more often
+# (seed terms always qualify), so two genuine rare values never swallow each other
+DOMINANCE = 10
+
+# Vocabularies main.py --vocabulary learns and saves
+VOCABULARIES = ["make", "driver_city", "color"]
+
+
+def edit_budget(term):
+    if len(term) >= TWO_EDIT_LENGTH:
+        return MAX_DISTANCE
+    return 1 if len(term) >= ONE_EDIT_LENGTH else 0
+
+
+def deletes(term, distance):
+    """term and every string obtained from it by deleting up to distance characters."""
+    found = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (edits plus adjacent swaps), or limit + 1 when above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def digits(term):
+    return re.sub(r"\D", "", term)
+
+
+# ------------------ Deletion index ------------------
+class TermIndex:
+    """SymSpell-style index: every term is stored under all its deletes within its edit budget.
+
+    Two strings within distance d share a delete of at most d characters, so a lookup
+    only generates the deletes of the query and verifies the few terms stored under them.
+    """
+
+    def __init__(self, weights, seeds=()):
+        self.weights = dict(weights)
+        self.seeds = set(seeds)
+        self.index = defaultdict(set)
+        for term in self.weights:
+            for key in deletes(term, edit_budget(term)):
+                self.index[key].add(term)
+
+    def lookup(self, value, count=0):
+        budget = edit_budget(value)
+        if budget == 0:
+            return None
+        candidates = set()
+        for key in deletes(value, budget):
+            candidates |= self.index.get(key, set())
+
+        best = None
+        for term in candidates:
+            if term == value or digits(term) != digits(value):
+                continue
+            if term not in self.seeds and self.weights[term] < DOMINANCE * max(count, 1):
+                continue
+            distance = edit_distance(value, term, min(budget, edit_budget(term)))
+            if distance > min(budget, edit_budget(term)):
+                continue
+            rank = (distance, -self.weights[term], term)
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best is not None else None
+
+
+# ------------------ Vocabularies ------------------
+class Vocabulary:
+    """Learned raw value -> canonical value corrections of one column.
+
+    learn() builds a TermIndex over the popular values (and seed terms) of a value_counts
+    Series and resolves each distinct value once. A correction saved by an earlier run is
+    kept while the value stays rare and its term still dominates it, and is otherwise
+    resolved again, so a value that became popular on its own loses it. resolve() applies
+    the corrections to a column through its distinct values only. Values without a
+    correction are kept.
+    """
+
+    def __init__(self, mappings=None):
+        self.mappings = dict(mappings or {})
+
+    def learn(self, counts, min_count, seeds=()):
+        counts = counts[counts > 0]
+        seeds = {s for s in seeds if isinstance(s, str)}
+        popular = counts[counts > min_count]
+        weights = {**{s: 0 for s in seeds}, **popular.to_dict()}
+        index = TermIndex(weights, seeds)
+
+        learned = dropped = 0
+        for value, count in counts.items():
+            if value in seeds:
+                self.mappings.pop(value, None)
+                continue
+            saved = self.mappings.pop(value, None)
+            if saved is not None and count <= min_count and (
+                    saved in seeds or counts.get(saved, 0) >= DOMINANCE * max(count, 1)):
+                self.mappings[value] = saved
+                continue
+            # new, or learned while rare and now popular itself or no longer dominated:
+            # resolved again from the current counts
+            term = index.lookup(value, count)
+            if term is not None:
+                self.mappings[value] = term
+            if term != saved:
+                learned += term is not None
+                dropped += saved is not None
+        # corrections may chain (A -> B learned earlier, B -> C now): follow them to the end
+        for value in list(self.mappings):
+            seen = {value}
+            while self.mappings[value] in self.mappings and self.mappings[value] not in seen:
+                seen.add(self.mappings[value])
+                self.mappings[value] = self.mappings[self.mappings[value]]
+        return learned, dropped
+
+    def resolve(self, column):
+        codes, uniques = pp.factorize_column(column)
+        resolved = np.array([self.mappings.get(v, v) if isinstance(v, str) else v for v in uniques], dtype=object)
+        return pd.Series(resolved[codes], index=column.index, name=column.name, dtype=object)
+
+    def resolve_counts(self, counts):
+        return counts.groupby(lambda v: self.mappings.get(v, v), sort=False).sum()
+
+
+def load_vocabularies(path, names=VOCABULARIES):
+    mappings = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            mappings = json.load(f)
+        print(f"Vocabularies loaded: {path} ({sum(len(m) for m in mappings.values())} corrections)")
+    return {name: Vocabulary(mappings.get(name)) for name in names}
+
+
+def save_vocabularies(vocabularies, path):
+    with open(path, "w") as f:
+        json.dump({name: dict(sorted(v.mappings.items())) for name, v in vocabularies.items()}, f, indent=2)
+    print(f"Vocabularies saved: {path} ({sum(len(v.mappings) for v in vocabularies.values())} corrections)")